@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Checks normalize_ages against row-wise age_preprocess and times both.
+
+Usage (from the repository root):
+
+    python -m benchmarks.age_normalization --rows 2000000 --baseline-rows 100000
+"""
+import click
+import numpy as np
+import pandas as pd
+
+from src.data.make_dataset import age_preprocess, normalize_ages
+from benchmarks.common import synthetic_reports, timed
+
+
+@click.command()
+@click.option("--rows", default=2_000_000, help="Rows in the synthetic frame.")
+@click.option(
+    "--baseline-rows",
+    default=100_000,
+    help="Rows timed with the row-wise baseline; its time is extrapolated to --rows.",
+)
+def main(rows, baseline_rows):
+    df = synthetic_reports(rows)
+    sample = df.iloc[:baseline_rows]
+
+    expected, t_row = timed(sample.apply, age_preprocess, axis=1)
+    got = normalize_ages(sample)
+    np.testing.assert_array_equal(got.to_numpy(), expected.to_numpy(dtype=float))
+    pd.testing.assert_index_equal(got.index, expected.index)
+
+    _, t_vec = timed(normalize_ages, df)
+    t_row_full = t_row * rows / len(sample)
+    print(
+        "rows=%d row-wise=%.2fs (extrapolated) vectorized=%.3fs speedup=%.0fx"
+        % (rows, t_row_full, t_vec, t_row_full / t_vec)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Compares row-wise brand_preprocess against the vectorized extract_brands.
+
+Usage (from the repository root):
+
+    python -m benchmarks.brand_extraction --rows 2000000 --baseline-rows 20000
+"""
+import click
+import pandas as pd
+
+from src.data.make_dataset import brand_preprocess, extract_brands
+from benchmarks.common import synthetic_reports, timed
+
+
+@click.command()
+@click.option("--rows", default=2_000_000, help="Rows in the synthetic frame.")
+@click.option(
+    "--baseline-rows",
+    default=20_000,
+    help="Rows timed with the row-wise baseline; its time is extrapolated to --rows.",
+)
+@click.option("--trim-len", "trim_lens", multiple=True, type=int, default=[1, 2, 3, 4])
+def main(rows, baseline_rows, trim_lens):
+    df = synthetic_reports(rows)
+    sample = df.iloc[:baseline_rows]
+
+    for trim_len in trim_lens:
+        expected, t_row = timed(
+            sample.apply, brand_preprocess, axis=1, trim_len=trim_len
+        )
+        got = extract_brands(sample, trim_len=trim_len)
+        pd.testing.assert_series_equal(
+            got.fillna("<NA>"), expected.astype(object).fillna("<NA>"), check_names=False
+        )
+
+        _, t_vec = timed(extract_brands, df, trim_len=trim_len)
+        t_row_full = t_row * rows / len(sample)
+        print(
+            "trim_len=%d rows=%d row-wise=%.2fs (extrapolated) vectorized=%.2fs speedup=%.0fx"
+            % (trim_len, rows, t_row_full, t_vec, t_row_full / t_vec)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+CATEGORIES = [
+    "Vit/Min/Prot/Unconv Diet(Human/Animal)",
+    "Cosmetics",
+    "Nuts/Edible Seed",
+    "Vegetables/Vegetable Products",
+    "Soft Drink/Water",
+    "Bakery Prod/Dough/Mix/Icing",
+    "Fishery/Seafood Prod",
+]
+
+AGE_UNITS = ["year(s)", "month(s)", "day(s)", "week(s)", "Decade(s)"]
+
+OUTCOMES = [
+    "Death",
+    "Life Threatening",
+    "Hospitalization",
+    "Disability",
+    "Patient Visited ER",
+    "Other Outcome",
+    "Medically Important",
+    "Non-Serious Injuries/ Illness",
+]
+
+SYMPTOMS = [
+    "DIARRHOEA",
+    "VOMITING",
+    "NAUSEA",
+    "ABDOMINAL PAIN",
+    "RASH",
+    "HEADACHE",
+    "DIZZINESS",
+    "CHOKING",
+    "DEATH",
+    "INJURY",
+]
+
+BRAND_WORDS = [
+    "QUORN",
+    "CENTRUM",
+    "HERBALIFE",
+    "L'OREAL",
+    "THE",
+    "NATURE'S",
+    "BOUNTY",
+    "PLANTERS",
+    "KIRKLAND",
+    "WEN",
+    "HYDROXYCUT",
+    "OF",
+]
+
+PRODUCT_WORDS = [
+    "MEATLESS",
+    "PIECES",
+    "VITAMIN",
+    "D3",
+    "CLEANSING",
+    "CONDITIONER",
+    "ROASTED",
+    "PEANUTS",
+    "(UNFLAVORED)",
+    "SHAKE,",
+    "MIX",
+    "AND",
+    "FOR",
+    "KIDS",
+]
+
+
+def synthetic_reports(n_rows, n_products=20000, seed=0, product_skew=0.0, id_offset=0):
+    """Builds a synthetic processed-layout CAERS frame for benchmarking.
+
+    Products are drawn from a fixed pool of `n_products` strings so that, like
+    the real data, product names repeat heavily across reports. With product_skew
+    the pool follows a Zipf-like popularity, "EXEMPTION 4" being the most reported.
+
+    Args:
+        n_rows (int): Number of report rows to generate.
+        n_products (int, optional): Size of the product name pool. Defaults to 20000.
+        seed (int, optional): Random seed. Defaults to 0.
+        product_skew (float, optional): Exponent of the product popularity, 0 for uniform. Defaults to 0.0.
+        id_offset (int, optional): Added to every report_id, so chunks get disjoint ids. Defaults to 0.
+
+    Returns:
+        [pd.DataFrame]: Frame with the columns produced by make_dataset before enrichment.
+    """
+    assert isinstance(n_rows, int) and n_rows > 0, "n_rows must be a positive int"
+    rng = np.random.default_rng(seed)
+
+    brand_part = rng.choice(BRAND_WORDS, size=(n_products, 2))
+    product_part = rng.choice(PRODUCT_WORDS, size=(n_products, 3))
+    pool = np.array(
+        [" ".join(b) + " " + " ".join(p) for b, p in zip(brand_part, product_part)],
+        dtype=object,
+    )
+    pool[0] = "EXEMPTION 4"
+    if product_skew > 0:
+        popularity = np.arange(1, n_products + 1, dtype=float) ** -product_skew
+        products = pool[rng.choice(n_products, n_rows, p=popularity / popularity.sum())]
+    else:
+        products = pool[rng.integers(0, n_products, n_rows)]
+    products[rng.random(n_rows) < 0.001] = np.nan
+
+    n_outcomes = len(OUTCOMES)
+    outcome_pool = np.array(
+        [
+            ", ".join(OUTCOMES[j] for j in sorted({i % n_outcomes, (i * 3) % n_outcomes}))
+            for i in range(n_outcomes * 4)
+        ],
+        dtype=object,
+    )
+    n_symptoms = len(SYMPTOMS)
+    symptom_pool = np.array(
+        [
+            ", ".join(SYMPTOMS[j] for j in sorted({i % n_symptoms, (i * 7) % n_symptoms}))
+            for i in range(n_symptoms * 4)
+        ],
+        dtype=object,
+    )
+
+    ages = rng.integers(0, 90, n_rows).astype(float)
+    age_units = np.array(AGE_UNITS, dtype=object)[
+        rng.choice(len(AGE_UNITS), n_rows, p=[0.9, 0.05, 0.02, 0.02, 0.01])
+    ]
+    missing_age = rng.random(n_rows) < 0.3
+    ages[missing_age] = np.nan
+    age_units[missing_age] = np.nan
+
+    start = np.datetime64("2004-01-01")
+    days = rng.integers(0, 17 * 365, n_rows)
+
+    return pd.DataFrame(
+        {
+            "report_id": id_offset + rng.integers(0, max(n_rows // 2, 1), n_rows),
+            "caers_created_date": pd.to_datetime(start + days),
+            "product": products,
+            "category": np.array(CATEGORIES, dtype=object)[
+                rng.integers(0, len(CATEGORIES), n_rows)
+            ],
+            "patient_age": ages,
+            "age_units": age_units,
+            "sex": np.array(["Female", "Male", "Not Reported"], dtype=object)[
+                rng.integers(0, 3, n_rows)
+            ],
+            "outcomes": outcome_pool[rng.integers(0, len(outcome_pool), n_rows)],
+            "medra_preferred_terms": symptom_pool[
+                rng.integers(0, len(symptom_pool), n_rows)
+            ],
+        }
+    )
+
+
+def timed(fn, *args, **kwargs):
+    """Runs fn once and returns its result together with the wall time.
+
+    Returns:
+        [tuple]: (result of fn, elapsed seconds)
+    """
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# Raw CAERS headers, before make_dataset normalizes them.
+RAW_COLUMNS = {
+    "report_id": "Report ID",
+    "caers_created_date": "CAERS Created Date",
+    "product": "Product",
+    "category": "Description",
+    "patient_age": "Patient Age",
+    "age_units": "Age Units",
+    "sex": "Sex",
+    "outcomes": "Outcomes",
+    "medra_preferred_terms": "MedDRA Preferred Terms",
+}
+
+
+def write_raw_csvs(
+    directory, n_files, rows_per_file, seed=0, chunk_rows=None, product_skew=0.0
+):
+    """Writes synthetic raw CAERS csv files for pipeline benchmarks.
+
+    Files are generated and appended chunk_rows rows at a time, so any number of
+    rows can be written with bounded memory.
+
+    Args:
+        directory ([Path]): Directory the files are written to.
+        n_files (int): Number of csv files.
+        rows_per_file (int): Rows in every file.
+        seed (int, optional): Random seed of the first file. Defaults to 0.
+        chunk_rows (int, optional): Rows generated at a time, None for whole files. Defaults to None.
+        product_skew (float, optional): Product popularity exponent, see synthetic_reports. Defaults to 0.0.
+
+    Returns:
+        [list]: paths of the written files.
+    """
+    chunk_rows = chunk_rows or rows_per_file
+    paths = []
+    for i in range(n_files):
+        path = Path(directory) / ("CAERS_%03d.csv" % i)
+        for j, start in enumerate(range(0, rows_per_file, chunk_rows)):
+            n_rows = min(chunk_rows, rows_per_file - start)
+            df = synthetic_reports(
+                n_rows,
+                seed=seed + i if j == 0 else (seed + i, j),
+                product_skew=product_skew,
+                id_offset=i * rows_per_file + start,
+            ).rename(columns=RAW_COLUMNS)
+            df["CAERS Created Date"] = df["CAERS Created Date"].dt.strftime("%m/%d/%Y")
+            df.to_csv(path, index=False, mode="w" if j == 0 else "a", header=j == 0)
+        paths.append(path)
+    return paths
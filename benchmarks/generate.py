@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Writes synthetic raw CAERS csv files with the real column schema.
+
+Usage (from the repository root):
+
+    python -m benchmarks.generate data/raw --rows 10000000 --files 8
+"""
+from pathlib import Path
+import click
+
+from benchmarks.common import write_raw_csvs
+
+
+@click.command()
+@click.argument("output_dirpath", type=click.Path())
+@click.option("--rows", default=1_000_000, show_default=True, help="Total rows over all files.")
+@click.option("--files", default=4, show_default=True, help="Number of raw csv files.")
+@click.option(
+    "--chunk-rows",
+    default=1_000_000,
+    show_default=True,
+    help="Rows generated at a time, bounds memory for large outputs.",
+)
+@click.option(
+    "--skew",
+    default=1.0,
+    show_default=True,
+    help="Zipf exponent of product popularity, 0 for uniform.",
+)
+@click.option("--seed", default=0, show_default=True, help="Random seed of the first file.")
+def main(output_dirpath, rows, files, chunk_rows, skew, seed):
+    outPath = Path(output_dirpath)
+    outPath.mkdir(parents=True, exist_ok=True)
+    paths = write_raw_csvs(
+        outPath,
+        files,
+        -(-rows // files),
+        seed=seed,
+        chunk_rows=chunk_rows,
+        product_skew=skew,
+    )
+    print("Wrote %d files with %d rows each to %s" % (len(paths), -(-rows // files), outPath))
+
+
+if __name__ == "__main__":
+    main()
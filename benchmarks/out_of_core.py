@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Checks that streamed Parquet aggregations match the in-memory ones and times both.
+
+Usage (from the repository root):
+
+    python -m benchmarks.out_of_core --rows 2000000 --batch-size 250000
+"""
+import tempfile
+import click
+import pandas as pd
+
+from src.data.make_dataset import extract_brands, write_frame
+from src.visualization.backends import PandasBackend, ParquetBackend
+from benchmarks.common import synthetic_reports, timed
+
+COSMETICS = {"category": "Cosmetics"}
+
+
+def run_queries(backend):
+    return [
+        backend.group_counts(["category", "outcomes"]),
+        backend.top_k("brand", 10, COSMETICS),
+        backend.symptom_frequencies(COSMETICS, exclude=["DEATH", "INJURY"]),
+        backend.period_counts("category"),
+    ]
+
+
+@click.command()
+@click.option("--rows", default=2_000_000, help="Rows in the synthetic frame.")
+@click.option("--batch-size", default=250_000, help="Rows per streamed Parquet batch.")
+def main(rows, batch_size):
+    df = synthetic_reports(rows)
+    df["brand"] = extract_brands(df)
+    df["outcomes"] = df["outcomes"].str.split(",")
+    df = df.explode("outcomes", ignore_index=True)
+    df["outcomes"] = df["outcomes"].str.strip()
+    df = df.rename(columns={"caers_created_date": "time_stamp"})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_frame(df, tmp, "exploded_data_time", "parquet")
+        expected, t_memory = timed(run_queries, PandasBackend(df))
+        got, t_stream = timed(run_queries, ParquetBackend(path, batch_size))
+
+    for a, b in zip(got, expected):
+        if isinstance(a, pd.DataFrame):
+            pd.testing.assert_frame_equal(
+                a, b, check_column_type=False, check_categorical=False
+            )
+        else:
+            pd.testing.assert_series_equal(
+                a, b, check_index_type=False, check_categorical=False, check_names=False
+            )
+    print(
+        "rows=%d in-memory=%.2fs streamed=%.2fs (batch_size=%d)"
+        % (len(df), t_memory, t_stream, batch_size)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Measures write time, read time and on-disk size of processed artifacts per format.
+
+Usage (from the repository root):
+
+    python -m benchmarks.output_formats --rows 1000000
+"""
+import tempfile
+import click
+
+from src.data.make_dataset import (
+    OUTPUT_FORMATS,
+    extract_brands,
+    normalize_ages,
+    read_frame,
+    write_frame,
+)
+from benchmarks.common import synthetic_reports, timed
+
+
+@click.command()
+@click.option("--rows", default=1_000_000, help="Rows in the synthetic frame.")
+@click.option(
+    "--format",
+    "fmts",
+    multiple=True,
+    type=click.Choice(list(OUTPUT_FORMATS)),
+    default=list(OUTPUT_FORMATS),
+)
+def main(rows, fmts):
+    processed = synthetic_reports(rows)
+    processed["brand"] = extract_brands(processed)
+    processed["patient_age"] = normalize_ages(processed)
+    processed = processed.drop(columns=["age_units"])
+
+    exploded = processed.copy()
+    exploded["outcomes"] = exploded["outcomes"].str.split(",")
+    exploded = exploded.explode("outcomes", ignore_index=True)
+    exploded["outcomes"] = exploded["outcomes"].str.strip()
+
+    artifacts = {"processed_data": processed, "exploded_data": exploded}
+
+    print("%-16s %-8s %10s %10s %10s" % ("artifact", "format", "write_s", "read_s", "size_mb"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, df in artifacts.items():
+            for fmt in fmts:
+                path, t_write = timed(write_frame, df, tmp, name, fmt)
+                _, t_read = timed(read_frame, tmp, name, fmt)
+                print(
+                    "%-16s %-8s %10.2f %10.2f %10.1f"
+                    % (name, fmt, t_write, t_read, path.stat().st_size / 2 ** 20)
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Wall time of make_dataset.main for an increasing number of worker processes.
+
+Usage (from the repository root):
+
+    python -m benchmarks.parallel_scaling --files 16 --rows-per-file 200000 --workers 1 2 4 16
+"""
+import filecmp
+import os
+import tempfile
+import time
+from pathlib import Path
+import click
+
+import pandas as pd
+
+from src.data.make_dataset import main as make_dataset, process_raw_files
+from src.data.profiling import REPORT_FILE
+from benchmarks.common import write_raw_csvs
+
+
+@click.command()
+@click.option("--files", default=16, help="Number of synthetic raw csv files.")
+@click.option("--rows-per-file", default=200_000, help="Rows in each raw file.")
+@click.option(
+    "--workers",
+    "worker_counts",
+    multiple=True,
+    type=int,
+    default=[1, 2, 4, os.cpu_count()],
+    help="Worker counts to time; repeat the option for several values.",
+)
+def main(files, rows_per_file, worker_counts):
+    with tempfile.TemporaryDirectory() as tmp:
+        rawPath = Path(tmp) / "raw"
+        rawPath.mkdir()
+        paths = write_raw_csvs(rawPath, files, rows_per_file)
+
+        reference = None
+        for workers in sorted(set(worker_counts)):
+            outPath = Path(tmp) / ("out_%d" % workers)
+            outPath.mkdir()
+            start = time.perf_counter()
+            make_dataset.main(
+                [str(rawPath), str(outPath), "--workers", str(workers)],
+                standalone_mode=False,
+            )
+            elapsed = time.perf_counter() - start
+
+            # The parallelized part alone: cleaning and brand-enriching raw files.
+            start = time.perf_counter()
+            pd.concat(process_raw_files(paths, workers=workers), ignore_index=True)
+            ingest = time.perf_counter() - start
+
+            if reference is None:
+                reference, t_serial, t_ingest_serial = outPath, elapsed, ingest
+            # The run report holds this run's timings and differs between runs.
+            names = [p.name for p in reference.iterdir() if p.name != REPORT_FILE]
+            _, mismatch, errors = filecmp.cmpfiles(reference, outPath, names, shallow=False)
+            assert not mismatch and not errors, "Outputs differ from the serial run"
+
+            print(
+                "workers=%-3d wall=%.2fs speedup=%.2fx ingest=%.2fs ingest_speedup=%.2fx"
+                % (workers, elapsed, t_serial / elapsed, ingest, t_ingest_serial / ingest)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Compares a regex scan of the product column with ProductIndex lookups.
+
+QUERIES are single brand words that never occur inside other synthetic words, so the
+substring scan and the whole-word lookup select the same rows.
+
+Usage (from the repository root):
+
+    python -m benchmarks.product_drilldown --rows 2000000
+"""
+import click
+import numpy as np
+
+from src.data.make_dataset import product_token_table
+from src.visualization.visualize import ProductIndex
+from benchmarks.common import synthetic_reports, timed
+
+QUERIES = ["QUORN", "CENTRUM", "HERBALIFE", "KIRKLAND"]
+
+
+def scan(df, query):
+    """The scan get_quorn_pie used to run on every call."""
+    return df[df["product"].str.contains(query) == True]
+
+
+@click.command()
+@click.option("--rows", default=2_000_000, help="Rows in the synthetic frame.")
+def main(rows):
+    df = synthetic_reports(rows)
+
+    tokens, t_tokens = timed(product_token_table, df["product"])
+    index, t_build = timed(ProductIndex, df, tokens)
+
+    t_scan = t_lookup = 0.0
+    for query in QUERIES:
+        expected, elapsed = timed(scan, df, query)
+        t_scan += elapsed
+        got, elapsed = timed(index.rows, query)
+        t_lookup += elapsed
+        np.testing.assert_array_equal(got.index.to_numpy(), expected.index.to_numpy())
+
+    print(
+        "rows=%d token table=%.2fs index build=%.2fs scan=%.4fs/query lookup=%.4fs/query"
+        % (
+            rows,
+            t_tokens,
+            t_build,
+            t_scan / len(QUERIES),
+            t_lookup / len(QUERIES),
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Load test of the aggregate server: p50/p99 latency and throughput.
+
+Start the server first, e.g. `python -m src.visualization.serve data/processed`, then
+(from the repository root):
+
+    python -m benchmarks.serve_load --requests 2000 --concurrency 32
+"""
+import asyncio
+import time
+import click
+import numpy as np
+
+DEFAULT_PATHS = [
+    "/brands_outcomes?category=Cosmetics",
+    "/time_trend",
+    "/time_trend?category=Cosmetics",
+    "/symptoms?variable=1",
+    "/symptoms?variable=2",
+    "/age_distribution?category=Cosmetics",
+]
+
+
+async def get(reader, writer, host, path):
+    """Sends one keep-alive GET and returns (status, body)."""
+    writer.write(("GET %s HTTP/1.1\r\nHost: %s\r\n\r\n" % (path, host)).encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def client(host, port, paths, remaining, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while remaining:
+            path = paths[remaining.pop() % len(paths)]
+            start = time.perf_counter()
+            status, _ = await get(reader, writer, host, path)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append((path, status))
+    finally:
+        writer.close()
+
+
+async def run(host, port, paths, requests, concurrency):
+    remaining = list(range(requests))
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[
+            client(host, port, paths, remaining, latencies, errors)
+            for _ in range(concurrency)
+        ]
+    )
+    return np.array(latencies), errors, time.perf_counter() - start
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8050, show_default=True)
+@click.option("--requests", default=1000, show_default=True, help="Total requests.")
+@click.option("--concurrency", default=16, show_default=True, help="Concurrent connections.")
+@click.option(
+    "--path",
+    "paths",
+    multiple=True,
+    default=DEFAULT_PATHS,
+    help="Request paths, cycled over; repeat the option for several.",
+)
+def main(host, port, requests, concurrency, paths):
+    latencies, errors, elapsed = asyncio.run(
+        run(host, port, list(paths), requests, concurrency)
+    )
+    print(
+        "requests=%d concurrency=%d errors=%d throughput=%.0f/s p50=%.1fms p99=%.1fms max=%.1fms"
+        % (
+            len(latencies),
+            concurrency,
+            len(errors),
+            len(latencies) / elapsed,
+            1000 * np.percentile(latencies, 50),
+            1000 * np.percentile(latencies, 99),
+            1000 * latencies.max(),
+        )
+    )
+    for path, status in errors[:10]:
+        print("error %d %s" % (status, path))
+
+
+if __name__ == "__main__":
+    main()
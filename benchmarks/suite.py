@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Times make_dataset.main stages and the visualize aggregations on synthetic data.
+
+Results are written as JSON; with --compare, timings slower than a previous
+result by more than --tolerance are listed and the exit status is 1.
+
+Usage (from the repository root):
+
+    python -m benchmarks.suite --rows 1000000 --output bench.json
+    python -m benchmarks.suite --rows 1000000 --output new.json --compare bench.json
+"""
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import click
+import numpy as np
+import pandas as pd
+
+from src.data.make_dataset import main as make_dataset
+from src.data.profiling import REPORT_FILE
+from src.visualization import visualize as vis
+from src.visualization.make_figures import RELV_OUTCOMES, ProcessedData
+from benchmarks.common import write_raw_csvs
+
+VITAMINS = "Vit/Min/Prot/Unconv Diet(Human/Animal)"
+SYMPTOMS = ["DIARRHOEA", "VOMITING", "NAUSEA", "ABDOMINAL PAIN"]
+
+
+def aggregation_cases(data):
+    """Name -> zero argument callable for every timed visualize aggregation."""
+    return {
+        "group_counts": lambda: vis.group_counts(
+            data["exploded_data"], ["category", "outcomes"]
+        ),
+        "period_counts": lambda: vis.period_counts(data["exploded_data_time"], "outcomes"),
+        "brand_outcome_counts": lambda: vis.brand_outcome_counts(
+            data.brands(), "Cosmetics", RELV_OUTCOMES
+        ),
+        "symptom_frequencies": lambda: vis.symptom_frequencies(
+            data["processed_data"], category="Cosmetics"
+        ),
+        "top_symptom_brands": lambda: vis.top_symptom_brands(
+            data["processed_data"], VITAMINS, SYMPTOMS
+        ),
+        "outcome_age_samples": lambda: vis.outcome_age_samples(
+            data.ages(), "Cosmetics", RELV_OUTCOMES
+        ),
+        "yearly_value_counts": lambda: vis.yearly_value_counts(
+            data["clean_data_time"], "year", "category", 1 / 50
+        ),
+        "group_index": lambda: vis.GroupIndex(data.ages(), ["category", "outcomes"]),
+        "product_index": lambda: vis.ProductIndex(
+            data["exploded_data_time"], data["product_tokens"]
+        ),
+    }
+
+
+def time_case(fn, repeats):
+    """Best wall time of fn over repeats runs, each on a cold aggregate cache."""
+    best = np.inf
+    for _ in range(repeats):
+        vis.AGGREGATE_CACHE.clear()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(result, baseline, tolerance):
+    """Timings of result slower than baseline by more than tolerance (a fraction).
+
+    Returns:
+        [list]: (name, baseline seconds, result seconds) tuples.
+    """
+    def flat(res):
+        timings = {"stage " + s["stage"]: s["wall_s"] for s in res["pipeline"]["stages"]}
+        timings.update(("aggregation " + k, v) for k, v in res["aggregations"].items())
+        return timings
+
+    old, new = flat(baseline), flat(result)
+    return [
+        (name, old[name], new[name])
+        for name in sorted(set(old) & set(new))
+        if new[name] > old[name] * (1 + tolerance)
+    ]
+
+
+@click.command()
+@click.option("--rows", default=1_000_000, show_default=True, help="Total synthetic raw rows.")
+@click.option("--files", default=4, show_default=True, help="Number of raw csv files.")
+@click.option("--seed", default=0, show_default=True, help="Random seed of the synthetic data.")
+@click.option("--repeats", default=3, show_default=True, help="Runs per aggregation, the best is kept.")
+@click.option("--output", type=click.Path(), default=None, help="JSON file for the results.")
+@click.option(
+    "--compare",
+    type=click.Path(exists=True),
+    default=None,
+    help="Previous results to check for regressions.",
+)
+@click.option(
+    "--tolerance",
+    default=0.2,
+    show_default=True,
+    help="Allowed slowdown against --compare, as a fraction.",
+)
+def main(rows, files, seed, repeats, output, compare, tolerance):
+    rows_per_file = -(-rows // files)
+    with tempfile.TemporaryDirectory() as tmp:
+        rawPath = Path(tmp) / "raw"
+        outPath = Path(tmp) / "processed"
+        rawPath.mkdir()
+        write_raw_csvs(rawPath, files, rows_per_file, seed=seed, product_skew=1.0)
+
+        make_dataset.main(
+            [str(rawPath), str(outPath), "--format", "parquet"], standalone_mode=False
+        )
+        pipeline = json.loads((outPath / REPORT_FILE).read_text())
+
+        data = ProcessedData(outPath, "parquet")
+        aggregations = {
+            name: time_case(fn, repeats) for name, fn in aggregation_cases(data).items()
+        }
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "rows": rows_per_file * files,
+            "files": files,
+            "seed": seed,
+            "repeats": repeats,
+        },
+        "pipeline": pipeline,
+        "aggregations": aggregations,
+    }
+    text = json.dumps(result, indent=2)
+    if output is not None:
+        Path(output).write_text(text)
+    else:
+        print(text)
+
+    if compare is not None:
+        slower = regressions(result, json.loads(Path(compare).read_text()), tolerance)
+        for name, before, after in slower:
+            print("REGRESSION %-32s %.3fs -> %.3fs" % (name, before, after))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Compares the per-symptom loop formerly used by top_vitamins_symptom_distribution
+with the single-pass top_symptom_brands.
+
+Usage (from the repository root):
+
+    python -m benchmarks.symptom_distribution --rows 2000000
+"""
+import click
+import pandas as pd
+
+from src.data.make_dataset import extract_brands
+from src.visualization.visualize import AGGREGATE_CACHE, top_symptom_brands
+from benchmarks.common import synthetic_reports, timed
+
+VITAMINS = "Vit/Min/Prot/Unconv Diet(Human/Animal)"
+SYMPTOMS = ["DIARRHOEA", "VOMITING", "NAUSEA", "ABDOMINAL PAIN"]
+
+
+def legacy_top_symptom_brands(data, category=VITAMINS, symptom_list=SYMPTOMS, k=5):
+    """Re-explodes the category once per symptom, as the original plot did."""
+    data = data.copy()
+    data["category"] = data["category"].str.strip()
+    grouped_desc = data.groupby("category")
+    rows = []
+    for symp in symptom_list:
+        group = grouped_desc.get_group(category).copy()
+        group["medra_preferred_terms"] = group["medra_preferred_terms"].str.split(",")
+        group = group.explode("medra_preferred_terms").drop_duplicates()
+        group["medra_preferred_terms"] = group["medra_preferred_terms"].str.strip()
+        group = group.groupby("medra_preferred_terms").get_group(symp)
+        counts = group["brand"].value_counts()
+        counts = counts.drop("EXEMPTION 4", errors="ignore")[:k]
+        rows.extend([brand, count, symp] for brand, count in counts.items())
+    return pd.DataFrame(rows, columns=["Products", "Reported Cases", "Symptom"])
+
+
+@click.command()
+@click.option("--rows", default=2_000_000, help="Rows in the synthetic frame.")
+def main(rows):
+    df = synthetic_reports(rows)
+    df["brand"] = extract_brands(df)
+
+    expected, t_loop = timed(legacy_top_symptom_brands, df)
+    AGGREGATE_CACHE.clear()
+    got, t_single = timed(top_symptom_brands, df, VITAMINS, SYMPTOMS)
+
+    # Ties may be ordered differently; symptoms and counts must match exactly.
+    pd.testing.assert_frame_equal(
+        got[["Symptom", "Reported Cases"]],
+        expected[["Symptom", "Reported Cases"]],
+        check_dtype=False,
+    )
+    print(
+        "rows=%d per-symptom loop=%.2fs single pass=%.2fs speedup=%.1fx"
+        % (rows, t_loop, t_single, t_loop / t_single)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,126 @@
 # -*- coding: utf-8 -*-
 import click
+import hashlib
+import json
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import re
 import string
 from nltk.corpus import stopwords
 
+from src.data.profiling import RunProfiler
+from src.data.schema import CODE_TABLES, apply_schema, log_memory
+
+# Categories whose brand name spans the first `trim_len` words of the product.
+TRIM_CATEGORIES = [
+    "Nuts/Edible Seed",
+    "Vit/Min/Prot/Unconv Diet(Human/Animal)",
+]
+
+# Multipliers converting each reported age unit to year(s).
+AGE_CONVERSION = {
+    "month(s)": 1 / 12,
+    "year(s)": 1,
+    "day(s)": 1 / 365,
+    "Decade(s)": 10,
+    "week(s)": 1 / 52,
+}
+
+# Processed artifact formats and the file suffix each one is written with.
+OUTPUT_FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+# Incremental builds keep per raw file partitions and their fingerprints here.
+PARTITION_DIR = "partitions"
+MANIFEST_FILE = "manifest.json"
+# Bump whenever process_raw_file output changes, so cached partitions are rebuilt.
+PARTITION_VERSION = 1
+
+# Artifacts main can write, in the order they are produced. --outputs also accepts
+# the names without "_data", e.g. exploded_time for exploded_data_time.
+ARTIFACTS = [
+    "clean_data",
+    "processed_data",
+    "reports",
+    "report_outcomes",
+    "outcome_codes",
+    "report_terms",
+    "term_codes",
+    "category_codes",
+    "brand_codes",
+    "product_tokens",
+    "exploded_data",
+    "clean_data_time",
+    "exploded_data_time",
+    "cube",
+    "cube_time",
+]
+
+# Stages main records in the run report, which --profile can pick from. Which of them
+# run depends on the options: "read+brand" replaces "read", "concat" and "brand" under
+# --workers and --incremental, and each artifact has its "write <artifact>" stage.
+STAGES = [
+    "read",
+    "concat",
+    "brand",
+    "read+brand",
+    "codes",
+    "age",
+    "parse outcomes",
+    "normalize",
+    "product tokens",
+    "explode",
+    "cube",
+    "dedup",
+    "explode time",
+    "cube time",
+] + ["write " + name for name in ARTIFACTS]
+
+# Keys of the pre-aggregated counts cube; "redacted" flags "EXEMPTION 4" products and
+# "complete" the rows holding every BRAND_COLUMNS value, as the brand figures count.
+CUBE_DIMENSIONS = [
+    "month",
+    "category",
+    "brand",
+    "outcomes",
+    "sex",
+    "age_bucket",
+    "redacted",
+    "complete",
+]
+
+# Columns the brand figures need on a row, as visualize.BRAND_COLUMNS.
+BRAND_COLUMNS = ["caers_created_date", "report_id", "product", "category", "outcomes", "brand"]
+
+# Left-closed patient_age (years) bins of the cube's age_bucket dimension.
+AGE_BUCKETS = {
+    "0-1": 0,
+    "2-11": 2,
+    "12-17": 12,
+    "18-29": 18,
+    "30-44": 30,
+    "45-64": 45,
+    "65+": 65,
+}
+
+PUNCTUATION_REGEX = re.compile("[%s]" % re.escape(string.punctuation))
+# Separators between the pieces of product words indexed in product_tokens.
+PIECE_PATTERN = r"[\s%s]+" % re.escape(string.punctuation)
+
+
+@lru_cache(maxsize=None)
+def english_stopwords():
+    """ Loads the nltk english stopwords once per process.
+
+    Returns:
+        [frozenset]: english stopwords
+    """
+    return frozenset(stopwords.words("english"))
+
 
 def brand_preprocess(row, trim_len=2):
     """ This function creates a brand name column by parsing out the product column of data. It trims the words based on trim length param to choose appropriate brand name.
@@ -38,10 +152,7 @@ def brand_preprocess(row, trim_len=2):
         return ""
 
     # for certain categories use trim length to select brand name.
-    if row["category"] in [
-        "Nuts/Edible Seed",
-        "Vit/Min/Prot/Unconv Diet(Human/Animal)",
-    ]:
+    if row["category"] in TRIM_CATEGORIES:
         return (
             " ".join(nameList)
             if len(nameList) < trim_len
@@ -50,6 +161,111 @@ def brand_preprocess(row, trim_len=2):
     return nameList[0]
 
 
+def product_tokens(products, token_cache=None):
+    """ Tokenizes product names the way brand_preprocess does, once per distinct product.
+
+    Args:
+        products ([pd.Series]): Unique, non-null product names.
+        token_cache (dict, optional): product -> tuple of tokens, filled in place with
+            products not seen before. Defaults to None.
+
+    Returns:
+        [pd.Series]: tuple of upper-cased, stopword-free tokens per product, same index as products.
+    """
+    assert isinstance(
+        products, pd.Series
+    ), "Check whether the function is called over Series"
+
+    if token_cache is None:
+        token_cache = {}
+
+    missing = products[products.map(token_cache).isna()]
+    if len(missing) > 0:
+        words = (
+            missing.str.replace(PUNCTUATION_REGEX, "", regex=True)
+            .str.lower()
+            .str.split(" ")
+            .explode()
+        )
+        words = words[~words.isin(english_stopwords())].str.upper()
+        found = words.groupby(level=0).agg(tuple)
+        token_cache.update(
+            (product, found.get(i, ())) for i, product in missing.items()
+        )
+
+    return products.map(token_cache)
+
+
+def extract_brands(df, trim_len=2, token_cache=None):
+    """ Column-at-a-time equivalent of df.apply(brand_preprocess, axis=1).
+
+    Every distinct product is tokenized only once (optionally across calls through
+    token_cache) and the brand is then gathered back onto the rows.
+
+    Args:
+        df ([pd.DataFrame]): Dataframe with product and category columns.
+        trim_len (int, optional): Length by which product name has to be trimmed. Defaults to 2.
+        token_cache (dict, optional): Cache of already tokenized products. Defaults to None.
+
+    Returns:
+        [pd.Series]: brand name for every row of df, pd.NA where product is missing.
+    """
+    assert isinstance(df, pd.DataFrame), "Check whether df is Pandas Dataframe or not."
+    assert isinstance(trim_len, int), "Check whether trim_len is int or not."
+
+    codes, uniques = pd.factorize(df["product"])
+    if len(uniques) == 0:
+        return pd.Series(pd.NA, index=df.index, dtype=object)
+    tokens = product_tokens(pd.Series(uniques, dtype=object), token_cache)
+
+    first = np.array([t[0] if len(t) > 0 else "" for t in tokens], dtype=object)
+    trimmed = np.array([" ".join(t[:trim_len]) for t in tokens], dtype=object)
+
+    use_trim = df["category"].isin(TRIM_CATEGORIES).to_numpy()
+    brands = np.where(use_trim, trimmed[codes], first[codes])
+    brands[codes == -1] = pd.NA
+    return pd.Series(brands, index=df.index, dtype=object)
+
+
+def product_token_table(products, token_cache=None):
+    """ Inverted index from product name tokens to the distinct products containing them.
+
+    A product is indexed under the tokens of product_tokens (its words with punctuation
+    removed, so every brand token is indexed) and under the pieces of its words split at
+    punctuation: QUORN-STYLE is indexed as QUORNSTYLE, QUORN and STYLE. Stopwords are
+    never indexed. visualize.product_search_tokens applies the same rules to one name,
+    and queries are tokenized like product_tokens.
+
+    Args:
+        products ([pd.Series]): Product names, may hold duplicates and missing values.
+        token_cache (dict, optional): Cache of already tokenized products. Defaults to None.
+
+    Returns:
+        [pd.DataFrame]: one (token, product) row per distinct pair, sorted by token.
+    """
+    assert isinstance(
+        products, pd.Series
+    ), "Check whether the function is called over Series"
+
+    uniques = pd.Series(products.dropna().unique(), dtype=object)
+    tokens = product_tokens(uniques, token_cache)
+    pieces = uniques.str.lower().str.split(PIECE_PATTERN).explode()
+    pieces = pieces[pieces.notna() & ~pieces.isin(english_stopwords())].str.upper()
+
+    table = pd.concat(
+        [
+            pd.DataFrame({"token": tokens.to_numpy(), "product": uniques.to_numpy()}),
+            pd.DataFrame(
+                {"token": pieces.to_numpy(), "product": uniques.to_numpy()[pieces.index]}
+            ),
+        ],
+        ignore_index=True,
+    )
+    table = table.explode("token").dropna()
+    table = table[table["token"] != ""].drop_duplicates()
+    return table.sort_values(["token", "product"], ignore_index=True)
+
+
 def age_preprocess(row):
     """This function converts age reports to a single unit : year(s)
     since Data has age reported in multiple units like month(s),day(s)
@@ -65,20 +281,45 @@ def age_preprocess(row):
         row, pd.Series
     ), "Check whether the function is called over Series"
 
-    age_conv = {
-        "month(s)": 1 / 12,
-        "year(s)": 1,
-        "day(s)": 1 / 365,
-        "Decade(s)": 10,
-        "week(s)": 1 / 52,
-    }
-
     unit = row["age_units"]
     age = row["patient_age"]
     if pd.isna(age) or pd.isna(unit):
         return -1
     else:
-        return row["patient_age"] * round(age_conv[unit], 4)
+        return row["patient_age"] * round(AGE_CONVERSION[unit], 4)
+
+
+def normalize_ages(df):
+    """Column-at-a-time equivalent of df.apply(age_preprocess, axis=1).
+
+    age_units is mapped through a categorical lookup array of year multipliers and
+    multiplied with patient_age in one NumPy operation. Missing ages or units give -1.
+    Units missing from AGE_CONVERSION are logged and treated as missing instead of
+    raising KeyError.
+
+    Args:
+        df ([pd.DataFrame]): Dataframe with patient_age and age_units columns.
+
+    Returns:
+        [pd.Series]: patient_age converted to years unit, same index as df.
+    """
+    assert isinstance(df, pd.DataFrame), "Check whether df is Pandas Dataframe or not."
+
+    units = pd.Categorical(df["age_units"], categories=list(AGE_CONVERSION))
+    codes = units.codes
+
+    unknown = (codes == -1) & df["age_units"].notna().to_numpy()
+    if unknown.any():
+        logging.getLogger(__name__).warning(
+            "Unknown age units treated as missing: %s",
+            df["age_units"][unknown].value_counts().to_dict(),
+        )
+
+    # Last slot is picked by code -1 (missing or unknown unit).
+    lookup = np.array([round(v, 4) for v in AGE_CONVERSION.values()] + [np.nan])
+    ages = df["patient_age"].to_numpy(dtype=float) * lookup[codes]
+    ages[np.isnan(ages)] = -1
+    return pd.Series(ages, index=df.index)
 
 
 def strip_str(x):
@@ -87,84 +328,780 @@ def strip_str(x):
     return x
 
 
+def clean_raw_chunk(df):
+    """Normalizes headers of a raw CAERS frame and strips whitespace from its text cells.
+
+    Only object columns are touched; non-string cells in them are left as they are,
+    exactly like applymap(strip_str).
+
+    Args:
+        df ([pd.DataFrame]): Raw frame (or chunk) as read from a CAERS csv.
+
+    Returns:
+        [pd.DataFrame]: Cleaned frame.
+    """
+    assert isinstance(df, pd.DataFrame), "Check whether df is Pandas Dataframe or not."
+
+    column_map = {x: x.lower().replace(" ", "_") for x in df.columns}
+    df = df.rename(columns=column_map)
+    df = df.rename(columns={"meddra_preferred_terms": "medra_preferred_terms"})
+
+    for col in df.columns[df.dtypes == object]:
+        stripped = df[col].str.strip()
+        df[col] = stripped.where(stripped.notna(), df[col])
+    return df
+
+
+def read_raw_reports(path, chunksize=None):
+    """Streams a raw CAERS csv as cleaned chunks.
+
+    Args:
+        path ([Path]): csv file to read.
+        chunksize (int, optional): Rows per chunk, None reads the whole file at once. Defaults to None.
+
+    Yields:
+        [pd.DataFrame]: cleaned chunk of at most chunksize rows.
+    """
+    reader = pd.read_csv(path, encoding="unicode_escape", chunksize=chunksize)
+    for chunk in [reader] if chunksize is None else reader:
+        yield clean_raw_chunk(chunk)
+
+
+def tidy_reports(df):
+    """Renames description to category and parses caers_created_date of cleaned raw data.
+
+    Args:
+        df ([pd.DataFrame]): Concatenated output of read_raw_reports.
+
+    Returns:
+        [pd.DataFrame]: clean data with a fresh range index.
+    """
+    assert isinstance(df, pd.DataFrame), "Check whether df is Pandas Dataframe or not."
+
+    df = df.rename(columns={"description": "category"})
+    df["caers_created_date"] = pd.to_datetime(df.caers_created_date)
+    return df.reset_index(drop=True)
+
+
+def process_raw_file(path, chunksize=None, token_cache=None):
+    """Cleans a single raw CAERS csv and adds its brand column.
+
+    Args:
+        path ([Path]): Raw csv file.
+        chunksize (int, optional): Rows per chunk when reading. Defaults to None.
+        token_cache (dict, optional): Product token cache passed to extract_brands. Defaults to None.
+
+    Returns:
+        [pd.DataFrame]: clean data of the file with a brand column.
+    """
+    return process_raw_chunk(
+        pd.concat(read_raw_reports(path, chunksize=chunksize)), token_cache=token_cache
+    )
+
+
+def process_raw_chunk(df, token_cache=None):
+    """Tidies cleaned raw rows and adds their brand column.
+
+    Every step is row-local, so processing the chunks of a file one by one and
+    concatenating them gives the same frame as processing the whole file.
+
+    Args:
+        df ([pd.DataFrame]): Output of read_raw_reports, a chunk or a whole file.
+        token_cache (dict, optional): Product token cache passed to extract_brands. Defaults to None.
+
+    Returns:
+        [pd.DataFrame]: clean data of the rows with a brand column.
+    """
+    df = tidy_reports(df)
+    df["brand"] = extract_brands(df, token_cache=token_cache)
+    return df
+
+
+def split_raw_file(path, chunksize=None, parts=1):
+    """Reads a raw CAERS csv as cleaned pieces that can be processed independently.
+
+    Args:
+        path ([Path]): csv file to read.
+        chunksize (int, optional): Rows per piece, None splits the file into parts pieces. Defaults to None.
+        parts (int, optional): Number of pieces when chunksize is None. Defaults to 1.
+
+    Yields:
+        [pd.DataFrame]: cleaned rows of the file, in file order.
+    """
+    if chunksize is not None:
+        yield from read_raw_reports(path, chunksize=chunksize)
+        return
+    df = next(read_raw_reports(path))
+    step = max(1, -(-len(df) // parts))
+    for start in range(0, max(len(df), 1), step):
+        yield df.iloc[start : start + step]
+
+
+def process_raw_files(paths, chunksize=None, workers=1):
+    """Runs process_raw_file over paths, in a process pool when workers > 1.
+
+    With at least as many files as workers every file goes to its own process.
+    Otherwise the files are processed one after the other and the chunks of each
+    file (or workers slices of it when chunksize is None) are spread over the pool.
+    Results are yielded in the order of paths regardless of which worker
+    finishes first, so concatenating them is deterministic.
+
+    Args:
+        paths (list): Raw csv files.
+        chunksize (int, optional): Rows per chunk when reading. Defaults to None.
+        workers (int, optional): Number of worker processes. Defaults to 1.
+
+    Yields:
+        [pd.DataFrame]: processed frame of each path.
+    """
+    if workers > 1 and len(paths) >= workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(process_raw_file, paths, repeat(chunksize))
+    elif workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for p in paths:
+                pieces = split_raw_file(p, chunksize=chunksize, parts=workers)
+                yield pd.concat(executor.map(process_raw_chunk, pieces), ignore_index=True)
+    else:
+        token_cache = {}
+        for p in paths:
+            yield process_raw_file(p, chunksize=chunksize, token_cache=token_cache)
+
+
+def file_fingerprint(path, previous=None):
+    """Fingerprints a raw file by size, mtime and sha256.
+
+    The file is only hashed when size or mtime differ from the previous fingerprint.
+
+    Args:
+        path ([Path]): File to fingerprint.
+        previous (dict, optional): Fingerprint recorded by an earlier run. Defaults to None.
+
+    Returns:
+        [dict]: size, mtime_ns and sha256 of the file.
+    """
+    stat = Path(path).stat()
+    if (
+        previous is not None
+        and previous.get("size") == stat.st_size
+        and previous.get("mtime_ns") == stat.st_mtime_ns
+    ):
+        return dict(previous)
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha.hexdigest()}
+
+
+def partition_settings(chunksize=None):
+    """Everything besides the raw file itself that a cached partition depends on.
+
+    Args:
+        chunksize (int, optional): Rows per chunk when reading raw files. Defaults to None.
+
+    Returns:
+        [dict]: JSON-serializable settings recorded in the manifest.
+    """
+    stopword_digest = hashlib.sha256(
+        " ".join(sorted(english_stopwords())).encode()
+    ).hexdigest()
+    return {
+        "version": PARTITION_VERSION,
+        "pandas": pd.__version__,
+        "chunksize": chunksize,
+        "trim_categories": list(TRIM_CATEGORIES),
+        "stopwords": stopword_digest,
+    }
+
+
+def update_partitions(paths, outPath, chunksize=None, workers=1):
+    """Brings per raw file partitions up to date and returns their concatenation.
+
+    Each raw file is cleaned and brand-enriched into outPath/partitions/<name>.pkl.
+    Files whose sha256 matches the manifest are loaded from their partition
+    instead of being re-processed, and partitions of removed files are deleted.
+    Every partition is rebuilt when the manifest was written with other
+    partition_settings (pipeline version, pandas, chunksize or brand rules).
+
+    Args:
+        paths (list): Raw csv files, in processing order.
+        outPath ([Path]): Processed data directory holding the manifest.
+        chunksize (int, optional): Rows per chunk when reading raw files. Defaults to None.
+        workers (int, optional): Processes used for changed files. Defaults to 1.
+
+    Returns:
+        [pd.DataFrame]: clean data of all files with a brand column.
+    """
+    logger = logging.getLogger(__name__)
+    outPath = Path(outPath)
+    partPath = outPath / PARTITION_DIR
+    partPath.mkdir(parents=True, exist_ok=True)
+
+    manifestPath = outPath / MANIFEST_FILE
+    manifest = json.loads(manifestPath.read_text()) if manifestPath.exists() else {}
+    fingerprints = manifest.get("files", {})
+    settings = partition_settings(chunksize)
+    reusable = manifest.get("settings") == settings
+    if fingerprints and not reusable:
+        logger.warning(
+            "Partition settings changed since the last run, re-processing every raw file"
+        )
+
+    new_manifest = {}
+    parts = {}
+    changed = []
+    for p in paths:
+        previous = fingerprints.get(p.name)
+        new_manifest[p.name] = file_fingerprint(p, previous)
+        part_file = partPath / (p.name + ".pkl")
+
+        if (
+            reusable
+            and previous is not None
+            and previous.get("sha256") == new_manifest[p.name]["sha256"]
+            and part_file.exists()
+        ):
+            logger.info("Reusing cached partition for %s", p.name)
+            parts[p] = pd.read_pickle(part_file)
+        else:
+            logger.info("Processing changed raw file %s", p.name)
+            changed.append(p)
+
+    for p, part in zip(changed, process_raw_files(changed, chunksize, workers)):
+        part.to_pickle(partPath / (p.name + ".pkl"))
+        parts[p] = part
+
+    for stale in set(fingerprints) - set(new_manifest):
+        logger.info("Dropping partition of removed raw file %s", stale)
+        (partPath / (stale + ".pkl")).unlink(missing_ok=True)
+
+    manifestPath.write_text(
+        json.dumps({"settings": settings, "files": new_manifest}, indent=2, sort_keys=True)
+    )
+    return pd.concat([parts[p] for p in paths], ignore_index=True)
+
+
+def write_frame(df, outPath, name, fmt="csv", categories=None):
+    """Writes a processed artifact as outPath/name.<fmt>, with the dtypes of apply_schema.
+
+    csv keeps the index as before; parquet and feather are written without the
+    (default range) index. The memory saved by the schema is logged.
+
+    Args:
+        df ([pd.DataFrame]): Dataframe to write.
+        outPath ([Path]): Output directory.
+        name (str): Artifact name without suffix, e.g. "processed_data".
+        fmt (str, optional): One of OUTPUT_FORMATS. Defaults to "csv".
+        categories (dict, optional): Code table values per categorical column, see apply_schema. Defaults to None.
+
+    Returns:
+        [Path]: path of the written file.
+    """
+    assert fmt in OUTPUT_FORMATS, "Check whether fmt is one of %s" % list(OUTPUT_FORMATS)
+
+    compact = apply_schema(df, categories)
+    log_memory(name, df, compact)
+
+    path = Path(outPath) / (name + OUTPUT_FORMATS[fmt])
+    if fmt == "csv":
+        compact.to_csv(path)
+    elif fmt == "parquet":
+        compact.to_parquet(path, index=False)
+    else:
+        compact.reset_index(drop=True).to_feather(path)
+    return path
+
+
+def read_frame(outPath, name, fmt="csv", categories=None):
+    """Reads a processed artifact written by write_frame, with the dtypes of apply_schema.
+
+    Args:
+        outPath ([Path]): Directory holding the processed data.
+        name (str): Artifact name without suffix, e.g. "processed_data".
+        fmt (str, optional): One of OUTPUT_FORMATS. Defaults to "csv".
+        categories (dict, optional): Code table values per categorical column, see read_categories. Defaults to None.
+
+    Returns:
+        [pd.DataFrame]: the artifact.
+    """
+    assert fmt in OUTPUT_FORMATS, "Check whether fmt is one of %s" % list(OUTPUT_FORMATS)
+
+    path = Path(outPath) / (name + OUTPUT_FORMATS[fmt])
+    if fmt == "parquet":
+        df = pd.read_parquet(path)
+    elif fmt == "feather":
+        df = pd.read_feather(path)
+    else:
+        df = pd.read_csv(path, index_col=0, low_memory=False)
+    return apply_schema(df, categories)
+
+
+def code_table(values, code_col, value_col):
+    """Interns the distinct values of a column as sorted integer codes.
+
+    Args:
+        values ([pd.Series]): Column to intern, e.g. category.
+        code_col (str): Name of the integer code column, e.g. "category_code".
+        value_col (str): Name of the value column, e.g. "category".
+
+    Returns:
+        [pd.DataFrame]: code table with code_col and value_col, codes being positions.
+    """
+    assert isinstance(values, pd.Series), "Check whether values is Pandas Series or not."
+
+    uniques = np.sort(values.dropna().unique().astype(object))
+    return pd.DataFrame(
+        {code_col: np.arange(len(uniques), dtype=np.int32), value_col: uniques}
+    )
+
+
+def read_categories(outPath, fmt="csv"):
+    """Loads the code tables present in outPath as categories for read_frame.
+
+    Args:
+        outPath ([Path]): Directory holding the processed data.
+        fmt (str, optional): One of OUTPUT_FORMATS. Defaults to "csv".
+
+    Returns:
+        [dict]: value column -> values in code order, for every code table found.
+    """
+    categories = {}
+    for name, code_col, value_col in CODE_TABLES:
+        path = Path(outPath) / (name + OUTPUT_FORMATS[fmt])
+        if not path.exists():
+            continue
+        if fmt == "csv":
+            # Code tables hold no missing values: keep e.g. the empty brand as "".
+            table = pd.read_csv(path, index_col=0, keep_default_na=False)
+        else:
+            table = read_frame(outPath, name, fmt)
+        categories[value_col] = list(table.sort_values(code_col)[value_col])
+    return categories
+
+
+def normalize_multivalued(values, code_col, value_col):
+    """Splits a comma separated column into a slim bridge table and a code table.
+
+    Items are stripped the same way the exploded outputs strip outcomes, so joining
+    the bridge back onto the reports reproduces DataFrame.explode.
+
+    Args:
+        values ([pd.Series]): Comma separated strings, indexed by row_id.
+        code_col (str): Name of the integer code column, e.g. "outcome_code".
+        value_col (str): Name of the decoded value column, e.g. "outcomes".
+
+    Returns:
+        [tuple]: (bridge with row_id and code_col, code table with code_col and value_col)
+    """
+    assert isinstance(values, pd.Series), "Check whether values is Pandas Series or not."
+
+    items = values.str.split(",").explode()
+    items = items[items.notna()].str.strip()
+    codes, uniques = pd.factorize(items, sort=True)
+
+    bridge = pd.DataFrame(
+        {"row_id": items.index.to_numpy(), code_col: codes.astype(np.int32)}
+    )
+    table = pd.DataFrame(
+        {code_col: np.arange(len(uniques), dtype=np.int32), value_col: uniques}
+    )
+    return bridge, table
+
+
+def exploded_view(reports, bridge, table):
+    """Rebuilds an exploded frame from the normalized layout with a join.
+
+    Args:
+        reports ([pd.DataFrame]): Report table with a row_id column.
+        bridge ([pd.DataFrame]): (row_id, code) bridge from normalize_multivalued.
+        table ([pd.DataFrame]): (code, value) table from normalize_multivalued.
+
+    Returns:
+        [pd.DataFrame]: one row per (report, value), reports without values kept once with NaN.
+    """
+    assert isinstance(reports, pd.DataFrame), "Check whether reports is Pandas Dataframe or not."
+    assert isinstance(bridge, pd.DataFrame), "Check whether bridge is Pandas Dataframe or not."
+    assert isinstance(table, pd.DataFrame), "Check whether table is Pandas Dataframe or not."
+
+    code_col, value_col = table.columns[:2]
+    values = bridge.merge(table, on=code_col, how="left", sort=False)
+    values = values.sort_values("row_id", kind="stable")
+    exploded = reports.merge(
+        values[["row_id", value_col]], on="row_id", how="left", sort=False
+    )
+    return exploded.reset_index(drop=True)
+
+
+def explode_with_bridge(reports, bridge, table):
+    """DataFrame.explode of a comma separated column, rebuilt from its normalized bridge.
+
+    Unlike exploded_view the result keeps the repeated index labels of reports, as
+    explode does, and is gathered by position instead of merged.
+
+    Args:
+        reports ([pd.DataFrame]): Frame whose index labels are the bridge row_ids.
+        bridge ([pd.DataFrame]): (row_id, code) bridge from normalize_multivalued.
+        table ([pd.DataFrame]): (code, value) table from normalize_multivalued, codes being positions.
+
+    Returns:
+        [pd.DataFrame]: one row per (report, value) with the value column replaced,
+            reports without values kept once with NaN.
+    """
+    assert isinstance(reports, pd.DataFrame), "Check whether reports is Pandas Dataframe or not."
+
+    code_col, value_col = table.columns[:2]
+    positions = reports.index.get_indexer(bridge["row_id"])
+    values = table[value_col].to_numpy()[bridge[code_col].to_numpy()]
+
+    missing = np.setdiff1d(np.arange(len(reports)), positions)
+    if len(missing) > 0:
+        order = np.argsort(np.concatenate([positions, missing]), kind="stable")
+        positions = np.concatenate([positions, missing])[order]
+        values = np.concatenate([values, np.full(len(missing), np.nan, dtype=object)])[order]
+
+    exploded = reports.take(positions)
+    exploded[value_col] = values
+    return exploded
+
+
+def with_time_columns(df, date_col="caers_created_date"):
+    """Renames date_col to time_stamp and appends its year, as the *_time artifacts store them.
+
+    Args:
+        df ([pd.DataFrame]): Processed or exploded data.
+        date_col (str, optional): Date column. Defaults to "caers_created_date".
+
+    Returns:
+        [pd.DataFrame]: df with time_stamp and year columns.
+    """
+    df = df.rename(columns={date_col: "time_stamp"})
+    df["year"] = df["time_stamp"].dt.year
+    return df
+
+
+def parse_outputs(ctx, param, value):
+    """click callback turning a comma separated --outputs value into ARTIFACTS names."""
+    if value is None:
+        return list(ARTIFACTS)
+    names = {name: name for name in ARTIFACTS}
+    names.update((name.replace("_data", ""), name) for name in ARTIFACTS)
+    requested = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in requested if v not in names]
+    if unknown:
+        raise click.BadParameter(
+            "unknown artifacts %s, choose from %s" % (unknown, ARTIFACTS)
+        )
+    return [name for name in ARTIFACTS if name in {names[v] for v in requested}]
+
+
+def age_buckets(ages):
+    """Bins patient_age (years) into the AGE_BUCKETS labels, "Unknown" for the -1 sentinel.
+
+    Args:
+        ages ([pd.Series]): patient_age converted by normalize_ages.
+
+    Returns:
+        [pd.Series]: bucket label per age.
+    """
+    buckets = pd.cut(
+        ages,
+        bins=list(AGE_BUCKETS.values()) + [np.inf],
+        labels=list(AGE_BUCKETS),
+        right=False,
+    )
+    return buckets.cat.add_categories("Unknown").fillna("Unknown")
+
+
+def build_cube(exploded, date_col="caers_created_date"):
+    """Pre-aggregates an exploded frame into counts keyed by CUBE_DIMENSIONS.
+
+    Two measures are kept: events counts exploded rows, reports counts each
+    source row once (on its first outcome), so summing reports over any slice
+    gives the number of un-exploded reports.
+
+    Args:
+        exploded ([pd.DataFrame]): Result of DataFrame.explode("outcomes") whose index still
+            repeats the label of the source row.
+        date_col (str, optional): Date column. Defaults to "caers_created_date".
+
+    Returns:
+        [pd.DataFrame]: one row per observed key combination with events and reports columns.
+    """
+    assert isinstance(exploded, pd.DataFrame), "Check whether exploded is Pandas Dataframe or not."
+
+    keys = pd.DataFrame(
+        {
+            "month": exploded[date_col].dt.to_period("M").dt.to_timestamp(),
+            "category": exploded["category"],
+            "brand": exploded["brand"],
+            "outcomes": exploded["outcomes"],
+            "sex": exploded["sex"],
+            "age_bucket": age_buckets(exploded["patient_age"]),
+            "redacted": exploded["product"] == "EXEMPTION 4",
+            "complete": exploded[[date_col] + BRAND_COLUMNS[1:]].notna().all(axis=1),
+            "events": 1,
+            "reports": ~exploded.index.duplicated(),
+        }
+    )
+    cube = keys.groupby(CUBE_DIMENSIONS, dropna=False, observed=True)[
+        ["events", "reports"]
+    ].sum()
+    return cube.astype(np.int64).reset_index()
+
+
 @click.command()
 @click.argument("input_dirpath", type=click.Path(exists=True))
 @click.argument("output_dirpath", type=click.Path())
+@click.option(
+    "--chunksize",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Read raw csv files in chunks of this many rows to bound peak memory.",
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(list(OUTPUT_FORMATS)),
+    default="csv",
+    show_default=True,
+    help="File format of the processed artifacts.",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only re-process raw files that changed since the last incremental run.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Processes used to clean and brand-enrich raw files, or the chunks of "
+    "a file when there are fewer files than processes, in parallel.",
+)
+@click.option(
+    "--profile",
+    "profile_stage",
+    type=click.Choice(STAGES),
+    default=None,
+    help="Dump cProfile stats of this stage (e.g. brand, or read+brand with --workers "
+    "or --incremental) next to the run report. Worker processes are not profiled.",
+)
+@click.option(
+    "--trace-malloc",
+    is_flag=True,
+    help="Record the tracemalloc peak of every stage in the run report "
+    "(slower; artifacts are then written one at a time).",
+)
+@click.option(
+    "--outputs",
+    callback=parse_outputs,
+    default=None,
+    help="Comma separated artifacts to write, e.g. exploded_time,processed. Defaults to all.",
+)
+@click.option(
+    "--write-threads",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Threads writing independent artifacts concurrently (ignored with --trace-malloc).",
+)
 def main(
-    input_dirpath="../../data/raw/", output_dirpath="../../data/processed",
+    input_dirpath="../../data/raw/",
+    output_dirpath="../../data/processed",
+    chunksize=None,
+    fmt="csv",
+    incremental=False,
+    workers=1,
+    profile_stage=None,
+    trace_malloc=False,
+    outputs=ARTIFACTS,
+    write_threads=4,
 ):
     """ Runs data processing scripts to turn raw data from (../raw) into
         cleaned data ready to be analyzed (saved in ../processed).
+        Stage timings and memory peaks are written to run_report.json.
     """
     outPath = Path(output_dirpath)
     inPath = Path(input_dirpath)
+    outPath.mkdir(parents=True, exist_ok=True)
 
     logger = logging.getLogger(__name__)
     logger.info("Creating clean unified data from raw files")
+    logger.info("Writing %s", ", ".join(outputs))
+    profiler = RunProfiler(trace_malloc=trace_malloc, profile_stage=profile_stage)
+    wanted = set(outputs)
 
-    aggReports = None
+    def write_stage(df, name, categories):
+        with profiler.stage("write " + name, len(df)) as stage:
+            write_frame(df, outPath, name, fmt, categories)
+            stage["rows_out"] = len(df)
 
-    for p in list(inPath.glob("*.csv")):
+    # tracemalloc is process wide, so traced stages must not overlap: write inline.
+    writer = None if trace_malloc else ThreadPoolExecutor(max_workers=write_threads)
+    pending = []
+    # Code table values per column, so every artifact shares the same integer codes.
+    categories = {}
 
-        curr_df = pd.read_csv(p, encoding="unicode_escape")
+    def write(df, name):
+        # Frames handed to the writer are never modified afterwards.
+        if name not in wanted:
+            return
+        if writer is None:
+            write_stage(df, name, dict(categories))
+        else:
+            pending.append(writer.submit(write_stage, df, name, dict(categories)))
 
-        column_map = {x: x.lower().replace(" ", "_") for x in curr_df.columns}
-        curr_df = curr_df.rename(columns=column_map)
-        curr_df = curr_df.rename(
-            columns={"meddra_preferred_terms": "medra_preferred_terms"}
-        )
-        curr_df = curr_df.applymap(strip_str)
+    paths = sorted(inPath.glob("*.csv"))
+    if incremental:
+        # Clean and brand-enrich only the raw files that changed.
+        with profiler.stage("read+brand") as stage:
+            aggReports = update_partitions(
+                paths, outPath, chunksize=chunksize, workers=workers
+            )
+            stage["rows_out"] = len(aggReports)
+    elif workers > 1:
+        # Clean and brand-enrich the raw files, or their chunks, in a process pool.
+        logger.info("Processing raw files with %d workers", workers)
+        with profiler.stage("read+brand") as stage:
+            aggReports = pd.concat(
+                process_raw_files(paths, chunksize=chunksize, workers=workers),
+                ignore_index=True,
+            )
+            stage["rows_out"] = len(aggReports)
+    else:
+        # Collect cleaned chunks and concatenate once to avoid re-copying a growing frame.
+        with profiler.stage("read") as stage:
+            chunks = []
+            for p in paths:
+                chunks.extend(read_raw_reports(p, chunksize=chunksize))
+            stage["rows_out"] = sum(len(c) for c in chunks)
+        with profiler.stage("concat", stage["rows_out"]) as stage:
+            aggReports = tidy_reports(pd.concat(chunks, ignore_index=True))
+            del chunks
+            stage["rows_out"] = len(aggReports)
 
-        aggReports = curr_df if aggReports is None else pd.concat([aggReports, curr_df])
+        # Create brand-enriched column.
+        logger.info("Making brand name column from clean data")
+        with profiler.stage("brand", len(aggReports)) as stage:
+            aggReports["brand"] = extract_brands(aggReports)
+            stage["rows_out"] = len(aggReports)
 
-    aggReports = aggReports.rename(columns={"description": "category"})
-    aggReports["caers_created_date"] = pd.to_datetime(aggReports.caers_created_date)
-    aggReports.reset_index(drop=True, inplace=True)
-    aggReports.to_csv(outPath / "clean_data.csv")
+    # Interned category and brand codes shared by all artifacts.
+    with profiler.stage("codes", len(aggReports)) as stage:
+        category_codes = code_table(aggReports["category"], "category_code", "category")
+        brand_codes = code_table(aggReports["brand"], "brand_code", "brand")
+        categories["category"] = list(category_codes["category"])
+        categories["brand"] = list(brand_codes["brand"])
+        stage["rows_out"] = len(category_codes) + len(brand_codes)
+    write(category_codes, "category_codes")
+    write(brand_codes, "brand_codes")
 
-    logger.info("Processing and enriching data")
+    if "clean_data" in wanted:
+        write(aggReports.drop(columns=["brand"]), "clean_data")
 
-    # Create brand-enriched column.
-    logger.info("Making brand name column from clean data")
-    aggReports["brand"] = aggReports.apply(brand_preprocess, axis=1)
+    logger.info("Processing and enriching data")
 
     # Pre-processing Age column.
-    logger.info("Converting age to a common unit year(s)")
-    aggReports["patient_age"] = aggReports.apply(age_preprocess, axis=1)
-    aggReports = aggReports.drop(columns=["age_units"])
+    if wanted - {"clean_data"}:
+        logger.info("Converting age to a common unit year(s)")
+        with profiler.stage("age", len(aggReports)) as stage:
+            aggReports = aggReports.drop(columns=["age_units"]).assign(
+                patient_age=normalize_ages(aggReports)
+            )
+            stage["rows_out"] = len(aggReports)
+    write(aggReports, "processed_data")
 
-    aggReports.to_csv(outPath / "processed_data.csv")
+    # Outcomes are parsed once into a slim bridge; both exploded outputs and their
+    # cubes are gathered from it instead of building per-row Python lists.
+    need_exploded = wanted & {"exploded_data", "exploded_data_time", "cube", "cube_time"}
+    need_time = wanted & {"clean_data_time", "exploded_data_time", "cube_time"}
+    if need_exploded or wanted & {"report_outcomes", "outcome_codes"}:
+        with profiler.stage("parse outcomes", len(aggReports)) as stage:
+            outcome_bridge, outcome_codes = normalize_multivalued(
+                aggReports["outcomes"], "outcome_code", "outcomes"
+            )
+            stage["rows_out"] = len(outcome_bridge)
+        categories["outcomes"] = list(outcome_codes["outcomes"])
+        write(outcome_bridge, "report_outcomes")
+        write(outcome_codes, "outcome_codes")
 
-    # Create exploded outcome-wise cleaned data.
-    logger.info("Making outcomes exploded data set from clean brand-name data")
-    aggReports.outcomes = aggReports.outcomes.apply(
-        lambda x: [y.strip() for y in x.split(",") if y != []]
-    )
-    expl_aggReports = aggReports.explode("outcomes")
-    expl_aggReports = expl_aggReports.reset_index(drop=True)
-    expl_aggReports.to_csv(outPath / "exploded_data.csv")
+    # Normalized layout: report table plus slim (row_id, code) bridges.
+    if wanted & {"reports", "report_terms", "term_codes"}:
+        logger.info("Making normalized report and MedDRA term tables")
+        with profiler.stage("normalize", len(aggReports)) as stage:
+            term_bridge, term_codes = normalize_multivalued(
+                aggReports["medra_preferred_terms"], "term_code", "medra_preferred_terms"
+            )
+            reports = aggReports.drop(columns=["outcomes"])
+            reports.insert(0, "row_id", aggReports.index.to_numpy())
+            stage["rows_out"] = len(term_bridge)
+        write(reports, "reports")
+        write(term_bridge, "report_terms")
+        write(term_codes, "term_codes")
+        del reports, term_bridge, term_codes
 
-    # Create time-stamp processed & exploded data.
-    aggReports_time = aggReports.drop_duplicates(
-        ["report_id", "patient_age", "category", "sex"], ignore_index=True
-    )
-    aggReports_time["year"] = aggReports_time["caers_created_date"].apply(
-        lambda x: x.year
-    )
-    aggReports_time = aggReports_time.rename(
-        columns={"caers_created_date": "time_stamp"}
-    )
-    aggReports_time.to_csv(outPath / "clean_data_time.csv")
+    # Token -> product inverted index for product drilldowns.
+    if "product_tokens" in wanted:
+        logger.info("Making product token index")
+        with profiler.stage("product tokens", len(aggReports)) as stage:
+            tokens = product_token_table(aggReports["product"])
+            stage["rows_out"] = len(tokens)
+        write(tokens, "product_tokens")
+
+    if need_exploded:
+        # Create exploded outcome-wise cleaned data.
+        logger.info("Making outcomes exploded data set from clean brand-name data")
+        with profiler.stage("explode", len(aggReports)) as stage:
+            expl_aggReports = explode_with_bridge(
+                aggReports, outcome_bridge, outcome_codes
+            )
+            stage["rows_out"] = len(expl_aggReports)
+        if "cube" in wanted:
+            with profiler.stage("cube", len(expl_aggReports)) as stage:
+                cube = build_cube(expl_aggReports, "caers_created_date")
+                stage["rows_out"] = len(cube)
+            write(cube, "cube")
+        if "exploded_data" in wanted:
+            write(expl_aggReports.reset_index(drop=True), "exploded_data")
+
+    if need_time:
+        # Time-stamp data keeps the first report per (report_id, patient_age, category, sex).
+        with profiler.stage("dedup", len(aggReports)) as stage:
+            first = ~aggReports.duplicated(["report_id", "patient_age", "category", "sex"])
+            stage["rows_out"] = int(first.sum())
+        if "clean_data_time" in wanted:
+            write(
+                with_time_columns(aggReports[first]).reset_index(drop=True),
+                "clean_data_time",
+            )
+
+        if wanted & {"exploded_data_time", "cube_time"}:
+            with profiler.stage("explode time", len(expl_aggReports)) as stage:
+                keep = first.to_numpy()[aggReports.index.get_indexer(expl_aggReports.index)]
+                expl_aggReports_time = with_time_columns(expl_aggReports[keep])
+                expl_aggReports_time.loc[
+                    (expl_aggReports_time["outcomes"] == "").to_numpy(), "outcomes"
+                ] = "Not Specified"
+                stage["rows_out"] = len(expl_aggReports_time)
+            if "cube_time" in wanted:
+                with profiler.stage("cube time", len(expl_aggReports_time)) as stage:
+                    cube_time = build_cube(expl_aggReports_time, "time_stamp")
+                    stage["rows_out"] = len(cube_time)
+                write(cube_time, "cube_time")
+            if "exploded_data_time" in wanted:
+                write(expl_aggReports_time.reset_index(drop=True), "exploded_data_time")
 
-    expl_aggReports_time = aggReports_time.explode("outcomes")
-    expl_aggReports_time["outcomes"] = expl_aggReports_time["outcomes"].str.strip()
-    expl_aggReports_time.loc[
-        expl_aggReports_time["outcomes"] == "", "outcomes"
-    ] = "Not Specified"
-    expl_aggReports_time = expl_aggReports_time.reset_index(drop=True)
-    expl_aggReports_time.to_csv(outPath / "exploded_data_time.csv")
+    # Wait for the writes, re-raising the first failure.
+    for future in pending:
+        future.result()
+    if writer is not None:
+        writer.shutdown()
 
-    logger.info("Data cleaning and pre-processing done!")
+    report = profiler.write(outPath)
+    logger.info("Data cleaning and pre-processing done! Run report in %s", report)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_FILE = "run_report.json"
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far in megabytes, None where unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+class RunProfiler:
+    """Records wall time, CPU time, row counts and memory peaks of pipeline stages.
+
+    Each stage is timed with a `with profiler.stage(...)` block whose record the
+    caller can complete with rows_out. Stages may overlap when run from threads,
+    e.g. concurrent artifact writes, but tracemalloc is process wide: run stages
+    one after the other when trace_malloc is set.
+
+    Args:
+        trace_malloc (bool, optional): Trace Python allocations of each stage with tracemalloc,
+            slower but exact per stage when stages do not overlap. Defaults to False.
+        profile_stage (str, optional): Stage run under cProfile. Defaults to None.
+    """
+
+    def __init__(self, trace_malloc=False, profile_stage=None):
+        self.trace_malloc = trace_malloc
+        self.profile_stage = profile_stage
+        self.stages = []
+        self.profiler = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """Times the enclosed block as stage name.
+
+        Args:
+            name (str): Stage name, e.g. "brand".
+            rows_in (int, optional): Rows entering the stage. Defaults to None.
+
+        Yields:
+            [dict]: the stage record; set its rows_out before the block ends.
+        """
+        record = {"stage": name, "rows_in": rows_in, "rows_out": None}
+        trace = self.trace_malloc and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        if profiler is not None:
+            profiler.enable()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - wall
+            record["cpu_s"] = time.process_time() - cpu
+            if profiler is not None:
+                profiler.disable()
+                self.profiler = profiler
+            if trace:
+                record["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                tracemalloc.stop()
+            record["peak_rss_mb"] = peak_rss_mb()
+            self.stages.append(record)
+            logging.getLogger(__name__).info(
+                "Stage %s: %.2fs wall, %.2fs cpu, rows %s -> %s",
+                name,
+                record["wall_s"],
+                record["cpu_s"],
+                rows_in,
+                record["rows_out"],
+            )
+
+    def report(self):
+        """Run report as a JSON-serializable dict."""
+        return {
+            "total_wall_s": time.perf_counter() - self._started,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.stages,
+        }
+
+    def write(self, outPath):
+        """Writes the run report, and the cProfile stats of profile_stage if it ran.
+
+        A warning is logged when profile_stage was set but never ran.
+
+        Args:
+            outPath ([Path]): Directory the report is written to.
+
+        Returns:
+            [Path]: path of the run report.
+        """
+        outPath = Path(outPath)
+        path = outPath / REPORT_FILE
+        path.write_text(json.dumps(self.report(), indent=2))
+        if self.profiler is not None:
+            self.profiler.dump_stats(str(outPath / ("profile_%s.pstats" % self.profile_stage)))
+        elif self.profile_stage is not None:
+            logging.getLogger(__name__).warning(
+                "Stage %s did not run, no profile written", self.profile_stage
+            )
+        return path
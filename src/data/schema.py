@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import logging
+import numpy as np
+import pandas as pd
+
+# Low-cardinality text columns stored as categoricals.
+CATEGORICAL_COLUMNS = [
+    "category",
+    "sex",
+    "outcomes",
+    "brand",
+    "product",
+    "age_units",
+    "age_bucket",
+]
+
+# Code tables written by make_dataset, as (artifact, code column, value column).
+CODE_TABLES = [
+    ("category_codes", "category_code", "category"),
+    ("brand_codes", "brand_code", "brand"),
+    ("outcome_codes", "outcome_code", "outcomes"),
+    ("term_codes", "term_code", "medra_preferred_terms"),
+]
+
+# Integer id-like columns, stored in the smallest nullable integer type that holds them.
+INTEGER_COLUMNS = ["report_id", "row_id", "year"]
+
+FLOAT32_COLUMNS = ["patient_age"]
+
+DATE_COLUMNS = ["caers_created_date", "time_stamp", "month"]
+
+NULLABLE_INTS = ["Int8", "Int16", "Int32", "Int64"]
+
+
+def smallest_int_dtype(values):
+    """Smallest nullable integer dtype holding every value, None if values are not all integers.
+
+    Args:
+        values ([pd.Series]): Column to check, may hold missing values or non-numeric strings.
+
+    Returns:
+        [str]: one of NULLABLE_INTS, or None.
+    """
+    numbers = pd.to_numeric(values, errors="coerce")
+    if numbers.isna().sum() != values.isna().sum():
+        return None
+    numbers = numbers.dropna()
+    if len(numbers) == 0:
+        return NULLABLE_INTS[0]
+    if not (numbers == np.floor(numbers)).all():
+        return None
+
+    lo, hi = numbers.min(), numbers.max()
+    for dtype in NULLABLE_INTS:
+        info = np.iinfo(dtype.lower())
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return None
+
+
+def apply_schema(df, categories=None):
+    """Casts the known columns of a processed frame to their compact dtypes.
+
+    Text columns holding lists (e.g. un-exploded outcomes) and id columns holding
+    non-numeric values are left as they are; unknown columns are not touched.
+    Categorical columns listed in categories take those values first, in order, so
+    their integer codes are the codes of the persisted code tables; values missing
+    from a table are appended after it.
+
+    Args:
+        df ([pd.DataFrame]): Processed dataframe.
+        categories (dict, optional): column -> values of its code table. Defaults to None.
+
+    Returns:
+        [pd.DataFrame]: Shallow copy of df with the schema dtypes.
+    """
+    assert isinstance(df, pd.DataFrame), "Check whether df is Pandas Dataframe or not."
+
+    categories = categories or {}
+    df = df.copy(deep=False)
+    for col in CATEGORICAL_COLUMNS:
+        if col not in df:
+            continue
+        is_categorical = isinstance(df[col].dtype, pd.CategoricalDtype)
+        if not is_categorical and pd.api.types.infer_dtype(df[col], skipna=True) != "string":
+            continue
+        if col in categories:
+            known = list(categories[col])
+            seen = df[col].cat.categories if is_categorical else df[col].dropna().unique()
+            extra = sorted(set(seen) - set(known))
+            df[col] = df[col].astype(pd.CategoricalDtype(known + extra))
+        elif not is_categorical:
+            df[col] = df[col].astype("category")
+    for col in INTEGER_COLUMNS:
+        if col in df and not pd.api.types.is_extension_array_dtype(df[col]):
+            dtype = smallest_int_dtype(df[col])
+            if dtype is not None:
+                df[col] = pd.to_numeric(df[col]).astype(dtype)
+    for col in FLOAT32_COLUMNS:
+        if col in df and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(np.float32)
+    for col in DATE_COLUMNS:
+        if col in df:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def memory_mb(df):
+    """Deep memory usage of df in megabytes."""
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def log_memory(name, before, after):
+    """Logs the deep memory usage of a frame before and after apply_schema.
+
+    Args:
+        name (str): Artifact name.
+        before ([pd.DataFrame]): Frame before apply_schema.
+        after ([pd.DataFrame]): Frame after apply_schema.
+    """
+    mb_before, mb_after = memory_mb(before), memory_mb(after)
+    logging.getLogger(__name__).info(
+        "%s: %d rows, %.1f MB -> %.1f MB (%.0f%%)",
+        name,
+        len(after),
+        mb_before,
+        mb_after,
+        100 * mb_after / mb_before if mb_before else 100,
+    )
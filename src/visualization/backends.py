@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import abc
+import numpy as np
+import pandas as pd
+
+from src.visualization import visualize as vis
+
+
+def _as_list(values):
+    return [values] if isinstance(values, str) or np.ndim(values) == 0 else list(values)
+
+
+def _filter_rows(df, filters):
+    """Rows of df whose columns take one of the filter values."""
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in filters.items():
+        mask &= vis.value_mask(df[column], values)
+    return df[mask]
+
+
+def _sum_partials(parts, levels=0):
+    """Adds up per-chunk aggregates that share an index, keeping first-seen order."""
+    if len(parts) == 1:
+        return parts[0]
+    return pd.concat(parts).groupby(level=levels, sort=False).sum()
+
+
+class AggregationBackend(abc.ABC):
+    """Runs the visualize aggregations chunk by chunk and combines the partial results.
+
+    Subclasses only provide chunks; every aggregation is computed on each chunk with
+    the in-memory functions of visualize and then summed, so a single chunk gives
+    exactly the in-memory result and more chunks give the same values.
+    """
+
+    @abc.abstractmethod
+    def chunks(self, columns, filters=None):
+        """Yields DataFrames with the given columns, restricted to rows matching filters.
+
+        Args:
+            columns (list): columns the aggregation needs.
+            filters (dict, optional): column -> value or list of values to keep. Defaults to None.
+        """
+
+    def group_counts(self, by, filters=None, cube_measure=None):
+        """Counts rows (or sums cube_measure) per group, see visualize.group_counts.
+
+        Args:
+            by (str or list): column(s) to group by.
+            filters (dict, optional): column -> value or list of values to keep. Defaults to None.
+            cube_measure (str, optional): cube column to sum. Defaults to None.
+
+        Returns:
+            (pd.Series): count per group, sorted by group.
+        """
+        keys = _as_list(by)
+        columns = keys + ([cube_measure] if cube_measure is not None else [])
+        parts = [
+            vis.group_counts(chunk, by, cube_measure)
+            for chunk in self.chunks(columns, filters)
+        ]
+        parts = [part for part in parts if len(part) > 0]
+        if not parts:
+            return pd.Series([], dtype=np.int64)
+        return _sum_partials(parts, list(range(len(keys)))).sort_index()
+
+    def top_k(self, by, k=10, filters=None, cube_measure=None):
+        """The k groups with the largest counts, ties kept in group order.
+
+        Args:
+            by (str): column to group by.
+            k (int, optional): groups kept. Defaults to 10.
+            filters (dict, optional): column -> value or list of values to keep. Defaults to None.
+            cube_measure (str, optional): cube column to sum. Defaults to None.
+
+        Returns:
+            (pd.Series): count per group, largest first.
+        """
+        counts = self.group_counts(by, filters, cube_measure)
+        return counts.sort_values(ascending=False, kind="stable")[:k]
+
+    def symptom_frequencies(self, filters=None, exclude=None):
+        """Counts MedDRA preferred terms, see visualize.symptom_frequencies.
+
+        Args:
+            filters (dict, optional): column -> value or list of values to keep. Defaults to None.
+            exclude (list, optional): terms removed from the result if present. Defaults to None.
+
+        Returns:
+            (pd.Series): count per term, in order of first occurrence
+        """
+        count_terms = vis.symptom_frequencies.__wrapped__
+        parts = [
+            count_terms(chunk)
+            for chunk in self.chunks(["medra_preferred_terms"], filters)
+        ]
+        parts = [part for part in parts if len(part) > 0]
+        if not parts:
+            return pd.Series([], dtype=np.int64)
+        counts = _sum_partials(parts)
+        if exclude is not None:
+            counts = counts.drop(exclude, errors="ignore")
+        return counts
+
+    def period_counts(self, by=None, freq="M", filters=None, cube_measure=None):
+        """Counts events per period and group, see visualize.period_counts.
+
+        Args:
+            by (str, optional): column whose values become the table columns. Defaults to None.
+            freq (str, optional): "W", "M" or "Q". Defaults to "M".
+            filters (dict, optional): column -> value or list of values to keep. Defaults to None.
+            cube_measure (str, optional): cube column to sum. Defaults to None.
+
+        Returns:
+            (pd.DataFrame): period start dates as index (named date), one column per group
+                or a single counts column when by is None.
+        """
+        columns = ["time_stamp"] if cube_measure is None else ["month", cube_measure]
+        if by is not None:
+            columns.append(by)
+        parts = [
+            vis.period_counts(chunk, by, freq, cube_measure)
+            for chunk in self.chunks(columns, filters)
+        ]
+        parts = [part for part in parts if len(part) > 0]
+        if not parts:
+            return vis.fill_periods(pd.DataFrame(columns=[] if by else ["counts"]), freq)
+        if len(parts) == 1:
+            return parts[0]
+        table = pd.concat(parts).groupby(level=0).sum()
+        table = vis.fill_periods(table.sort_index(axis=1), freq)
+        return table.astype(np.int64)
+
+
+class PandasBackend(AggregationBackend):
+    """Aggregations over an in-memory DataFrame, as a single chunk.
+
+    Args:
+        df (pd.DataFrame): processed data.
+    """
+
+    def __init__(self, df):
+        assert isinstance(df, pd.DataFrame), "Check whether df is Pandas Dataframe or not."
+        self.df = df
+
+    def chunks(self, columns, filters=None):
+        yield _filter_rows(self.df, filters)[columns]
+
+
+class ParquetBackend(AggregationBackend):
+    """Aggregations streamed over Parquet files, one record batch at a time.
+
+    Only the needed columns are read and the filters are applied by the Arrow scanner,
+    so only matching rows are converted to pandas and memory is bounded by batch_size
+    rows whatever the size of the data. Needs pyarrow.
+
+    Args:
+        path (str or Path): Parquet file, or directory of Parquet partitions.
+        batch_size (int, optional): rows per streamed chunk. Defaults to 1_000_000.
+    """
+
+    def __init__(self, path, batch_size=1_000_000):
+        import pyarrow.dataset as ds
+
+        assert isinstance(batch_size, int) and batch_size > 0, "batch_size must be a positive int"
+        self._ds = ds
+        self.dataset = ds.dataset(str(path), format="parquet")
+        self.batch_size = batch_size
+
+    def chunks(self, columns, filters=None):
+        expression = None
+        for column, values in (filters or {}).items():
+            condition = self._ds.field(column).isin(_as_list(values))
+            expression = condition if expression is None else expression & condition
+        batches = self.dataset.to_batches(
+            columns=list(columns), filter=expression, batch_size=self.batch_size
+        )
+        for batch in batches:
+            if batch.num_rows > 0:
+                yield batch.to_pandas()
+
+
+def open_backend(data, batch_size=1_000_000):
+    """Backend for data: in-memory for a DataFrame, streamed for a Parquet path.
+
+    Args:
+        data (pd.DataFrame or str or Path): processed data, or where it is stored as Parquet.
+        batch_size (int, optional): rows per streamed chunk. Defaults to 1_000_000.
+
+    Returns:
+        (AggregationBackend): backend running the aggregations over data.
+    """
+    if isinstance(data, pd.DataFrame):
+        return PandasBackend(data)
+    return ParquetBackend(data, batch_size)
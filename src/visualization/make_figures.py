@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+import click
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+from src.data.make_dataset import OUTPUT_FORMATS, read_categories, read_frame
+from src.visualization import visualize as vis
+from src.visualization.backends import PandasBackend, ParquetBackend
+
+RELV_OUTCOMES = [
+    "Death",
+    "Life Threatening",
+    "Hospitalization",
+    "Disability",
+    "Patient Visited ER",
+]
+
+# Outcomes left out of the outcome trend figure.
+NOT_INTERESTED = [
+    "Medically Important",
+    "Other Outcome",
+    "Patient Visited Healthcare Provider",
+    "Other Seriousness",
+    "Required Intervention",
+    "Congenital Anomaly",
+    "Not Specified",
+]
+
+# compact_json holds base64 typed arrays, readable by plotly.js >= 2.28 only (not by plotly.io).
+FIGURE_FORMATS = {
+    "png": ".png",
+    "html": ".html",
+    "json": ".json",
+    "compact_json": ".compact.json",
+}
+
+# Figures of reports/figures. Each entry names a builder from FIGURE_BUILDERS and its params.
+REPORT_FIGURES = [
+    {
+        "name": "events_vs_time",
+        "builder": "time_trend",
+        "params": {"data": "clean_data_time", "title": "number of reports over time"},
+    },
+    {
+        "name": "major_categories",
+        "builder": "category_pie",
+        "params": {"data": "processed_data", "top": 5},
+    },
+    {
+        "name": "outcomes_vs_time",
+        "builder": "group_trends",
+        "params": {
+            "data": "exploded_data_time",
+            "by": "outcomes",
+            "exclude": NOT_INTERESTED,
+            "title": "outcome over time",
+        },
+    },
+    {
+        "name": "categories_vs_time",
+        "builder": "normalized_trends",
+        "params": {"data": "exploded_data_time", "by": "category", "top": 5},
+    },
+    {
+        "name": "category_wise_outcomes",
+        "builder": "category_outcomes",
+        "params": {"data": "exploded_data", "top": 5},
+    },
+    {
+        "name": "cosmetics_brands_outcomes",
+        "builder": "brands_outcomes",
+        "params": {
+            "category": "Cosmetics",
+            "title": "Cosmetics | Brand-wise Reported Adverse Events Count",
+        },
+    },
+    {
+        "name": "vitamins_brands_outcomes",
+        "builder": "brands_outcomes",
+        "params": {
+            "category": "Vit/Min/Prot/Unconv Diet(Human/Animal)",
+            "title": "Vitamins/Minerals | Brand-wise Reported Adverse Events Count",
+        },
+    },
+    {
+        "name": "veg_brands_outcomes",
+        "builder": "brands_outcomes",
+        "params": {
+            "category": "Vegetables/Vegetable Products",
+            "title": "Vegetables/Veg-Based | Brand-wise Reported Adverse Events Count",
+        },
+    },
+    {
+        "name": "cosmetics_vs_time",
+        "builder": "time_trend",
+        "params": {
+            "data": "exploded_data_time",
+            "category": "Cosmetics",
+            "title": "Cosmetics over time",
+        },
+    },
+    {
+        "name": "vitamins_vs_time",
+        "builder": "time_trend",
+        "params": {
+            "data": "exploded_data_time",
+            "category": "Vit/Min/Prot/Unconv Diet(Human/Animal)",
+            "title": "Vitamins over time",
+        },
+    },
+    {
+        "name": "cosmetics_symptoms",
+        "builder": "symptoms",
+        "params": {"variable": 1, "title": "Symptoms for Cosmetics"},
+    },
+    {
+        "name": "vitamins_symptoms",
+        "builder": "symptom_brands",
+        "params": {},
+    },
+    {
+        "name": "quorn_symptoms",
+        "builder": "symptoms",
+        "params": {"variable": 2, "title": "Symptoms for Quorn"},
+    },
+    {
+        "name": "cosmetics_age",
+        "builder": "age_distribution",
+        "params": {"category": "Cosmetics"},
+    },
+    {
+        "name": "vitamins_age",
+        "builder": "age_distribution",
+        "params": {"category": "Vit/Min/Prot/Unconv Diet(Human/Animal)"},
+    },
+    {
+        "name": "quorn_vs_time",
+        "builder": "brand_outcomes_over_time",
+        "params": {"brand": "QUORN"},
+    },
+]
+
+
+class ProcessedData:
+    """Loads each processed artifact at most once.
+
+    Args:
+        dirpath (Path): Directory holding the processed data.
+        fmt (str, optional): Format the artifacts were written in. Defaults to "csv".
+        out_of_core (bool, optional): Stream backend() aggregations from the Parquet
+            artifacts instead of loading them. Defaults to False.
+    """
+
+    def __init__(self, dirpath, fmt="csv", out_of_core=False):
+        assert not out_of_core or fmt == "parquet", "out_of_core needs parquet artifacts"
+        self.dirpath = Path(dirpath)
+        self.fmt = fmt
+        self.out_of_core = out_of_core
+        self._frames = {}
+        self._indexes = {}
+        self._backends = {}
+        # Code tables, so categorical columns of every artifact share the same codes.
+        self.categories = read_categories(self.dirpath, fmt)
+
+    def __getitem__(self, name):
+        if name not in self._frames:
+            logging.getLogger(__name__).info("Loading %s", name)
+            self._frames[name] = read_frame(
+                self.dirpath, name, self.fmt, self.categories
+            )
+        return self._frames[name]
+
+    def backend(self, name):
+        """AggregationBackend over the artifact name, streamed from disk when out_of_core."""
+        if name not in self._backends:
+            if self.out_of_core:
+                path = self.dirpath / (name + OUTPUT_FORMATS[self.fmt])
+                self._backends[name] = ParquetBackend(path)
+            else:
+                self._backends[name] = PandasBackend(self[name])
+        return self._backends[name]
+
+    def exists(self, name):
+        """Whether the artifact name was written to the processed data directory."""
+        return (self.dirpath / (name + OUTPUT_FORMATS[self.fmt])).exists()
+
+    def brands(self):
+        """Exploded data restricted to complete brand rows, as used by the brand figures."""
+        if "_brands" not in self._frames:
+            self._frames["_brands"] = self["exploded_data"][vis.BRAND_COLUMNS].dropna()
+        return self._frames["_brands"]
+
+    def brand_reports(self):
+        """Report table restricted to the reports behind brands(), to count with report_outcomes."""
+        if "_brand_reports" not in self._frames:
+            columns = [col for col in vis.BRAND_COLUMNS if col != "outcomes"]
+            self._frames["_brand_reports"] = self["reports"].dropna(subset=columns)
+        return self._frames["_brand_reports"]
+
+    def ages(self):
+        """Exploded data restricted to reports with a known patient age."""
+        if "_ages" not in self._frames:
+            df = self["exploded_data"]
+            self._frames["_ages"] = df[df["patient_age"] > 0]
+        return self._frames["_ages"]
+
+    def product_index(self, df):
+        """ProductIndex of a frame returned by this object, from the product_tokens artifact if present."""
+        key = (id(df), "product")
+        if key not in self._indexes:
+            tokens = self["product_tokens"] if self.exists("product_tokens") else None
+            self._indexes[key] = vis.ProductIndex(df, tokens)
+        return self._indexes[key]
+
+    def index(self, df, keys):
+        """GroupIndex of a frame returned by this object, built once and shared by builders."""
+        key = (id(df), tuple(keys))
+        if key not in self._indexes:
+            self._indexes[key] = vis.GroupIndex(df, keys)
+        return self._indexes[key]
+
+
+def build_time_trend(data, params):
+    filters = {"category": params["category"]} if "category" in params else None
+    table = data.backend(params["data"]).period_counts(filters=filters)
+    return vis.time_trend_figure(table, params["title"])
+
+
+def build_category_pie(data, params):
+    top = data.backend(params["data"]).top_k("category", k=params["top"])
+    top_cat_df = vis.drop_unused_categories(top.rename("#events").reset_index())
+    fig = px.pie(top_cat_df, values="#events", names="category", width=1200, height=800)
+    fig.update_layout(uniformtext_minsize=24, uniformtext_mode="hide")
+    return fig
+
+
+def build_group_trends(data, params):
+    df = data[params["data"]]
+    names = list(vis.group_counts(df, params["by"]).sort_values(ascending=False).index)
+    return vis.plot_scatters(
+        df.groupby(params["by"], observed=True),
+        names,
+        params["title"],
+        fil=True,
+        filter_list=params.get("exclude", []),
+    )
+
+
+def build_normalized_trends(data, params):
+    df = data[params["data"]]
+    top = vis.group_counts(df, params["by"]).sort_values(ascending=False)
+    names = list(top.index[: params["top"]])
+    groups = [df[vis.value_mask(df[params["by"]], name)] for name in names]
+    return vis.plot_normalized_scatters(groups, names, return_fig=True)
+
+
+def build_category_outcomes(data, params):
+    # Counted on the report/outcome bridge, without loading the exploded data.
+    counts = vis.bridge_counts(
+        data.brand_reports(),
+        data["report_outcomes"],
+        data["outcome_codes"],
+        by="category",
+    )
+    top = counts.groupby(level="category").sum().sort_values(ascending=False)
+    df = counts.rename("#events").reset_index()
+    df = df[vis.value_mask(df["outcomes"], RELV_OUTCOMES)]
+    df = df[vis.value_mask(df["category"], top.index[: params["top"]])]
+    return vis.plot_bar_histogram(
+        vis.drop_unused_categories(df),
+        title="Category-wise outcomes distribution",
+        x="category",
+        color="outcomes",
+        logscale=True,
+        y="#events",
+        return_fig=True,
+    )
+
+
+def build_brands_outcomes(data, params):
+    df = data.brands()
+    fig_hist, fig_pie = vis.brands_vs_outcomes_plot(
+        df,
+        params["category"],
+        params["title"],
+        relv_outcomes=RELV_OUTCOMES,
+        return_fig=True,
+        index=data.index(df, ["category"]),
+    )
+    return {"": fig_hist, "_pie": fig_pie}
+
+
+def build_symptoms(data, params):
+    df = data["processed_data"]
+    keys = ["brand"] if params["variable"] == 2 else ["category"]
+    dic = vis.symptom_counter(df, params["variable"], index=data.index(df, keys))
+    return vis.top_symptoms(dic, params["title"], return_fig=True)
+
+
+def build_symptom_brands(data, params):
+    return vis.top_vitamins_symptom_distribution(
+        data["processed_data"], return_fig=True, **params
+    )
+
+
+def build_age_distribution(data, params):
+    df = data.ages()
+    return vis.age_dist_plot(
+        df,
+        params["category"],
+        return_fig=True,
+        index=data.index(df, ["category", "outcomes"]),
+    )
+
+
+def build_brand_outcomes_over_time(data, params):
+    df = data.brands()
+    if "product" in params:
+        df = data.product_index(df).rows(params["product"])
+    else:
+        df = df[vis.value_mask(df["brand"], params["brand"])]
+    df = vis.drop_unused_categories(df[["caers_created_date", "outcomes"]])
+    return px.histogram(df, x="caers_created_date", color="outcomes")
+
+
+FIGURE_BUILDERS = {
+    "time_trend": build_time_trend,
+    "category_pie": build_category_pie,
+    "group_trends": build_group_trends,
+    "normalized_trends": build_normalized_trends,
+    "category_outcomes": build_category_outcomes,
+    "brands_outcomes": build_brands_outcomes,
+    "symptoms": build_symptoms,
+    "symptom_brands": build_symptom_brands,
+    "age_distribution": build_age_distribution,
+    "brand_outcomes_over_time": build_brand_outcomes_over_time,
+}
+
+
+def write_figure(fig_json, path_stem, formats, compact_json=None):
+    """Writes a serialized figure in every requested format. Runs in worker processes.
+
+    Args:
+        fig_json (str): Figure serialized with fig.to_json().
+        path_stem (str): Output path without suffix.
+        formats (list): Keys of FIGURE_FORMATS.
+        compact_json (str, optional): Figure serialized with visualize.compact_figure_json,
+            needed for the compact_json format. Defaults to None.
+
+    Returns:
+        [float]: seconds spent writing.
+    """
+    start = time.perf_counter()
+    fig = None
+    for fmt in formats:
+        path = path_stem + FIGURE_FORMATS[fmt]
+        if fmt == "json":
+            Path(path).write_text(fig_json)
+        elif fmt == "compact_json":
+            Path(path).write_text(compact_json)
+        else:
+            if fig is None:
+                fig = pio.from_json(fig_json)
+            if fmt == "html":
+                fig.write_html(path)
+            else:
+                fig.write_image(path)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.argument("processed_dirpath", type=click.Path(exists=True))
+@click.argument("output_dirpath", type=click.Path())
+@click.option(
+    "--spec",
+    type=click.Path(exists=True),
+    default=None,
+    help="JSON list of {name, builder, params} figures; defaults to the report figures.",
+)
+@click.option("--only", multiple=True, help="Render only figures with these names.")
+@click.option(
+    "--format",
+    "formats",
+    multiple=True,
+    type=click.Choice(list(FIGURE_FORMATS)),
+    default=["png"],
+    show_default=True,
+)
+@click.option(
+    "--data-format",
+    type=click.Choice(list(OUTPUT_FORMATS)),
+    default="csv",
+    show_default=True,
+    help="Format the processed data was written in.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Processes used to write figure files.",
+)
+@click.option(
+    "--out-of-core",
+    is_flag=True,
+    help="Stream the time trend and category aggregates from Parquet artifacts.",
+)
+def main(
+    processed_dirpath="../../data/processed",
+    output_dirpath="../../reports/figures",
+    spec=None,
+    only=(),
+    formats=("png",),
+    data_format="csv",
+    workers=1,
+    out_of_core=False,
+):
+    """ Renders report figures from processed data (../processed) into
+        image/html/json files (saved in ../../reports/figures), with timings.
+    """
+    logger = logging.getLogger(__name__)
+    outPath = Path(output_dirpath)
+    outPath.mkdir(parents=True, exist_ok=True)
+
+    figures = json.loads(Path(spec).read_text()) if spec else REPORT_FIGURES
+    if only:
+        figures = [f for f in figures if f["name"] in only]
+    for f in figures:
+        assert f["builder"] in FIGURE_BUILDERS, "Unknown builder %s" % f["builder"]
+
+    data = ProcessedData(processed_dirpath, data_format, out_of_core)
+    timings = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for f in figures:
+            logger.info("Building %s", f["name"])
+            start = time.perf_counter()
+            built = FIGURE_BUILDERS[f["builder"]](data, f.get("params", {}))
+            build_s = time.perf_counter() - start
+
+            if not isinstance(built, dict):
+                built = {"": built}
+            for suffix, fig in built.items():
+                name = f["name"] + suffix
+                timings[name] = {"build_s": build_s}
+                # Encoded from the built figure, whose dates are still datetimes.
+                compact = vis.compact_figure_json(fig) if "compact_json" in formats else None
+                pending[name] = executor.submit(
+                    write_figure, fig.to_json(), str(outPath / name), list(formats), compact
+                )
+
+        for name, future in pending.items():
+            timings[name]["write_s"] = future.result()
+            logger.info(
+                "Wrote %s (build %.2fs, write %.2fs)",
+                name,
+                timings[name]["build_s"],
+                timings[name]["write_s"],
+            )
+
+    (outPath / "timings.json").write_text(json.dumps(timings, indent=2))
+    logger.info("Figures done!")
+
+
+if __name__ == "__main__":
+    log_fmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import click
+import inspect
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from src.data.make_dataset import OUTPUT_FORMATS
+from src.visualization import visualize as vis
+from src.visualization.make_figures import RELV_OUTCOMES, ProcessedData
+
+
+def brands_outcomes_view(data, category):
+    """Aggregates behind brands_vs_outcomes_plot for one category."""
+    df = data.brands()
+    brand_counts, top_brands = vis.brand_outcome_counts(
+        df, category, RELV_OUTCOMES, index=data.index(df, ["category"])
+    )
+    return {
+        "brand_counts": brand_counts.to_dict("records"),
+        "top_brands": top_brands.to_dict("records"),
+    }
+
+
+def time_trend_view(data, category=None, freq="M"):
+    """Report counts per period behind plot_time_trend, optionally for one category."""
+    filters = {"category": category} if category is not None else None
+    table = data.backend("clean_data_time").period_counts(freq=freq, filters=filters)
+    return {
+        "date": [d.strftime("%Y-%m-%d") for d in table.index],
+        "counts": table["counts"].tolist(),
+    }
+
+
+def symptoms_view(data, variable=0, top=20):
+    """Most frequent symptoms from symptom_counter, as (symptom, count) pairs."""
+    df = data["processed_data"]
+    keys = ["brand"] if variable == 2 else ["category"]
+    dic = vis.symptom_counter(df, variable, index=data.index(df, keys))
+    return {"symptoms": sorted(dic.items(), key=lambda item: -item[1])[:top]}
+
+
+def age_distribution_view(data, category):
+    """KDE curves behind age_dist_plot, per relevant outcome with enough samples."""
+    df = data.ages()
+    samples = vis.outcome_age_samples(
+        df, category, RELV_OUTCOMES, index=data.index(df, ["category", "outcomes"])
+    )
+    curves = {}
+    for outcome, ages in zip(RELV_OUTCOMES, samples):
+        curve = vis.kde_curve(ages, bin_size=5)
+        if curve is not None:
+            curves[outcome] = {"n": len(ages), "x": curve[0].tolist(), "y": curve[1].tolist()}
+    return {"curves": curves}
+
+
+def int_range(lo, hi=None):
+    """Parser of an integer query parameter in [lo, hi], raising ValueError outside."""
+
+    def parse(value):
+        number = int(value)
+        if number < lo:
+            raise ValueError("%d is below %d" % (number, lo))
+        if hi is not None and number > hi:
+            raise ValueError("%d is above %d" % (number, hi))
+        return number
+
+    return parse
+
+
+def choice(*values):
+    """Parser of a query parameter taking one of values, raising ValueError otherwise."""
+
+    def parse(value):
+        if value not in values:
+            raise ValueError("%r is not one of %s" % (value, ", ".join(values)))
+        return value
+
+    return parse
+
+
+# Route -> (view, {query parameter: parser}); parameters without a default are required.
+ROUTES = {
+    "/brands_outcomes": (brands_outcomes_view, {"category": str}),
+    "/time_trend": (time_trend_view, {"category": str, "freq": choice("W", "M", "Q")}),
+    "/symptoms": (symptoms_view, {"variable": int_range(0, 2), "top": int_range(1)}),
+    "/age_distribution": (age_distribution_view, {"category": str}),
+}
+
+
+def parse_query(view, parsers, query):
+    """Parameters of view parsed from a query string.
+
+    Args:
+        view (function): view the parameters are passed to.
+        parsers (dict): query parameter -> parser raising ValueError on bad values.
+        query (str): URL query string.
+
+    Raises:
+        ValueError: on an unknown, repeated, missing or invalid parameter.
+
+    Returns:
+        (dict): keyword arguments of view.
+    """
+    params = {}
+    for name, value in parse_qsl(query):
+        if name not in parsers:
+            raise ValueError("unknown parameter %s" % name)
+        if name in params:
+            raise ValueError("repeated parameter %s" % name)
+        try:
+            params[name] = parsers[name](value)
+        except ValueError as e:
+            raise ValueError("bad parameter %s: %s" % (name, e))
+    required = [
+        name
+        for name, parameter in list(inspect.signature(view).parameters.items())[1:]
+        if parameter.default is inspect.Parameter.empty
+    ]
+    missing = [name for name in required if name not in params]
+    if missing:
+        raise ValueError("missing parameter %s" % ", ".join(missing))
+    return params
+
+
+def warm_up(data):
+    """Loads every frame and index the views use, before requests share them across threads."""
+    data.backend("clean_data_time")
+    processed = data["processed_data"]
+    data.index(processed, ["category"])
+    data.index(processed, ["brand"])
+    data.index(data.brands(), ["category"])
+    data.index(data.ages(), ["category", "outcomes"])
+
+
+def _to_json(value):
+    # numpy scalars and anything else json does not know.
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class AggregateServer:
+    """Answers aggregate queries as JSON over HTTP/1.1 from one asyncio event loop.
+
+    Views run on a thread pool sharing the loaded data. Concurrent identical
+    requests await the same computation, and encoded answers are kept in an LRU.
+
+    Args:
+        data (ProcessedData): processed data, loaded once.
+        workers (int, optional): threads running the views. Defaults to 4.
+        cache_size (int, optional): answers kept in the LRU. Defaults to 256.
+    """
+
+    def __init__(self, data, workers=4, cache_size=256):
+        self.data = data
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.cache = vis.AggregateCache(cache_size)
+        self.inflight = {}
+        self.coalesced = 0
+
+    def compute(self, key, view, params):
+        return self.cache.get_or_compute(
+            key, lambda: json.dumps(view(self.data, **params), default=_to_json).encode()
+        )
+
+    async def answer(self, path, query):
+        """Encoded JSON answer of a route, with its HTTP status."""
+        if path == "/health":
+            stats = dict(self.cache.info(), coalesced=self.coalesced, inflight=len(self.inflight))
+            return 200, json.dumps(stats).encode()
+        if path not in ROUTES:
+            return 404, json.dumps({"error": "unknown route %s" % path}).encode()
+
+        view, parsers = ROUTES[path]
+        try:
+            params = parse_query(view, parsers, query)
+        except ValueError as e:
+            return 400, json.dumps({"error": str(e)}).encode()
+
+        key = (path,) + tuple(sorted(params.items()))
+        future = self.inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self.compute, key, view, params)
+            self.inflight[key] = future
+            future.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        try:
+            return 200, await asyncio.shield(future)
+        except Exception as e:
+            logging.getLogger(__name__).exception("Query %s failed", key)
+            return 500, json.dumps({"error": repr(e)}).encode()
+
+    async def handle(self, reader, writer):
+        """Serves the requests of one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                if method != "GET":
+                    status, body = 405, b'{"error": "only GET is supported"}'
+                else:
+                    url = urlsplit(target)
+                    status, body = await self.answer(url.path, url.query)
+
+                close = headers.get("connection", "").lower() == "close"
+                writer.write(
+                    b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\nConnection: %s\r\n\r\n"
+                    % (
+                        status,
+                        b"OK" if status == 200 else b"Error",
+                        len(body),
+                        b"close" if close else b"keep-alive",
+                    )
+                    + body
+                )
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        logging.getLogger(__name__).info("Serving on http://%s:%d", host, port)
+        async with server:
+            await server.serve_forever()
+
+
+@click.command()
+@click.argument("processed_dirpath", type=click.Path(exists=True))
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8050, show_default=True)
+@click.option(
+    "--data-format",
+    type=click.Choice(list(OUTPUT_FORMATS)),
+    default="csv",
+    show_default=True,
+    help="Format the processed data was written in.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Threads running aggregate queries.",
+)
+@click.option(
+    "--out-of-core",
+    is_flag=True,
+    help="Stream the time trend aggregates from Parquet artifacts.",
+)
+def main(
+    processed_dirpath,
+    host="127.0.0.1",
+    port=8050,
+    data_format="csv",
+    workers=4,
+    out_of_core=False,
+):
+    """ Serves the aggregates behind the report plots as JSON, from processed data
+        (../processed) loaded once at startup.
+    """
+    data = ProcessedData(processed_dirpath, data_format, out_of_core)
+    logging.getLogger(__name__).info("Loading processed data")
+    warm_up(data)
+    asyncio.run(AggregateServer(data, workers).serve(host, port))
+
+
+if __name__ == "__main__":
+    log_fmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
@@ -1,10 +1,590 @@
 import plotly.express as px
-from collections import defaultdict
+import base64
+import hashlib
+import inspect
+import itertools
+import json
+import re
+import string
+import threading
+from collections import OrderedDict, defaultdict
+from functools import lru_cache, wraps
+from plotly.colors import DEFAULT_PLOTLY_COLORS
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
-import plotly.figure_factory as ff
 import pandas as pd
 import numpy as np
+from nltk.corpus import stopwords
+
+PUNCTUATION_REGEX = re.compile("[%s]" % re.escape(string.punctuation))
+PIECE_REGEX = re.compile(r"[\s%s]+" % re.escape(string.punctuation))
+
+# Columns a row needs to be counted by the brand figures; cubes flag such rows as complete.
+BRAND_COLUMNS = ["caers_created_date", "report_id", "product", "category", "outcomes", "brand"]
+
+
+class AggregateCache:
+    """Bounded LRU store for computed aggregates, with hit/miss counters.
+
+    Args:
+        maxsize (int, optional): Number of aggregates kept before the least recently used is evicted. Defaults to 32.
+    """
+
+    def __init__(self, maxsize=32):
+        assert isinstance(maxsize, int) and maxsize > 0, "maxsize must be a positive int"
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._store = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """Returns the aggregate stored under key, calling compute() on a miss."""
+        with self._lock:
+            if key in self._store:
+                self.hits += 1
+                self._store.move_to_end(key)
+                return self._store[key]
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            self._store[key] = value
+            self._store.move_to_end(key)
+            while len(self._store) > self.maxsize:
+                self._store.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Drops every stored aggregate and resets the counters."""
+        with self._lock:
+            self._store.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Returns hits, misses, current size and maxsize as a dict."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._store),
+                "maxsize": self.maxsize,
+            }
+
+
+AGGREGATE_CACHE = AggregateCache()
+
+def frame_fingerprint(df):
+    """Content hash of a DataFrame or Series (values, index, column names and dtypes).
+
+    The hash is recomputed on every call, so a frame modified in place gets a new
+    fingerprint and never hits aggregates cached for its old content.
+
+    Args:
+        df (pd.DataFrame or pd.Series): input data
+
+    Returns:
+        (str): hex digest identifying the content
+    """
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    if isinstance(df, pd.DataFrame):
+        digest.update(repr(list(df.columns)).encode())
+        digest.update(repr(list(df.dtypes.astype(str))).encode())
+    return digest.hexdigest()
+
+
+def _cache_key_part(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return ("frame", frame_fingerprint(value))
+    if isinstance(value, (list, tuple)):
+        return tuple(_cache_key_part(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _cache_key_part(v)) for k, v in value.items()))
+    if isinstance(value, (GroupIndex, ProductIndex)):
+        # An index only speeds up row selection, results do not depend on it.
+        return None
+    return value
+
+
+def cached_aggregate(fn):
+    """Memoizes fn in AGGREGATE_CACHE, keyed by fn, input data fingerprints and arguments.
+
+    Cached results are shared between calls and must not be modified by callers.
+    """
+    signature = inspect.signature(fn)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (fn.__qualname__,) + tuple(
+            (name, _cache_key_part(value)) for name, value in bound.arguments.items()
+        )
+        return AGGREGATE_CACHE.get_or_compute(key, lambda: fn(*args, **kwargs))
+
+    return wrapper
+
+
+def group_counts(df, by, cube_measure=None):
+    """Counts rows per group of df, or sums cube_measure when df is an aggregate cube.
+
+    Args:
+        df (pd.DataFrame): row level data, or a cube written by make_dataset.
+        by (str or list): column(s) to group by.
+        cube_measure (str, optional): cube column to sum ("events" or "reports"). Defaults to None.
+
+    Returns:
+        (pd.Series): count per group.
+    """
+    if cube_measure is None:
+        return df.groupby(by, observed=True).size()
+    return df.groupby(by, observed=True)[cube_measure].sum()
+
+
+@cached_aggregate
+def bridge_counts(reports, bridge, codes, by=None):
+    """Counts exploded (report, value) rows per value straight from a normalized bridge.
+
+    Gives the counts of group_counts over the exploded frame that make_dataset.exploded_view
+    would rebuild from reports, without building it. Bridge rows of reports missing from
+    reports are ignored, so reports may be any filtered subset of the report table.
+
+    Args:
+        reports (pd.DataFrame): report table with a row_id column, e.g. the reports artifact.
+        bridge (pd.DataFrame): (row_id, code) bridge, e.g. the report_outcomes artifact.
+        codes (pd.DataFrame): (code, value) table whose codes are positions, e.g. outcome_codes.
+        by (str or list, optional): report columns counted per as well. Defaults to None.
+
+    Returns:
+        (pd.Series): count per (by..., value), in order of first occurrence.
+    """
+    assert isinstance(reports, pd.DataFrame), "Check whether reports is Pandas Dataframe or not."
+    code_col, value_col = codes.columns[:2]
+    by = [] if by is None else [by] if isinstance(by, str) else list(by)
+
+    positions = pd.Index(reports["row_id"].to_numpy(dtype=np.int64)).get_indexer(
+        bridge["row_id"].to_numpy(dtype=np.int64)
+    )
+    keep = positions >= 0
+    positions = positions[keep]
+    values = codes.sort_values(code_col)[value_col].to_numpy(dtype=object)
+    keys = {col: reports[col].to_numpy(dtype=object)[positions] for col in by}
+    keys[value_col] = values[bridge[code_col].to_numpy(dtype=np.int64)[keep]]
+    return pd.DataFrame(keys).groupby(by + [value_col], sort=False).size()
+
+
+def value_mask(column, values):
+    """Boolean mask of the rows of column holding one of values.
+
+    On a categorical column the names are translated to integer codes once,
+    through its categories, and the rows are matched on the code array.
+
+    Args:
+        column (pd.Series): column to match, categorical or not.
+        values (str or list): value(s) to keep.
+
+    Returns:
+        (np.ndarray): True where column is one of values.
+    """
+    values = [values] if isinstance(values, str) or np.ndim(values) == 0 else list(values)
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return column.isin(values).to_numpy()
+    codes = column.cat.categories.get_indexer(values)
+    codes = codes[codes >= 0]
+    column_codes = column.cat.codes.to_numpy()
+    if len(codes) == 1:
+        return column_codes == codes[0]
+    return np.isin(column_codes, codes)
+
+
+def drop_unused_categories(df):
+    """Shallow copy of df whose categorical columns keep only the categories present.
+
+    plotly express groups by its color and facet columns with observed=False, so
+    categories filtered out of a frame must be dropped before it is plotted.
+
+    Args:
+        df (pd.DataFrame): frame to plot.
+
+    Returns:
+        (pd.DataFrame): df with unused categories removed.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+
+class GroupIndex:
+    """Row positions of a frame per combination of key values, built with one groupby.
+
+    Build it once per frame and pass it to the plotting functions taking an index
+    argument, so every (category, outcome) selection is a dictionary lookup instead
+    of a filter or get_group over the whole frame. Missing keys select no rows.
+
+    Args:
+        df (pd.DataFrame): frame the positions refer to.
+        keys (list, optional): columns to index. Defaults to ["category", "outcomes"].
+    """
+
+    def __init__(self, df, keys=("category", "outcomes")):
+        assert isinstance(df, pd.DataFrame), "Check whether df is Pandas Dataframe or not."
+        self.df = df
+        self.keys = list(keys)
+        indices = df.groupby(self.keys, observed=True, sort=False, dropna=False).indices
+        if len(self.keys) == 1:
+            indices = {(key,): positions for key, positions in indices.items()}
+        self._positions = indices
+
+    def positions(self, **selection):
+        """Sorted row positions matching the selection.
+
+        Args:
+            **selection: key column -> value or list of values. Unselected keys match anything.
+
+        Returns:
+            (np.ndarray): positions into df, in row order.
+        """
+        assert set(selection) <= set(self.keys), "Check whether selection uses indexed keys."
+        wanted = []
+        for key in self.keys:
+            values = selection.get(key)
+            if values is not None and (isinstance(values, str) or np.ndim(values) == 0):
+                values = [values]
+            wanted.append(None if values is None else set(values))
+
+        if all(w is not None for w in wanted):
+            parts = [
+                self._positions[key]
+                for key in itertools.product(*wanted)
+                if key in self._positions
+            ]
+        else:
+            parts = [
+                positions
+                for key, positions in self._positions.items()
+                if all(w is None or k in w for k, w in zip(key, wanted))
+            ]
+        if not parts:
+            return np.array([], dtype=np.intp)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def rows(self, **selection):
+        """Rows of df matching the selection, see positions."""
+        return self.df.iloc[self.positions(**selection)]
+
+    def column(self, name, **selection):
+        """Values of one column for the rows matching the selection, as a NumPy array."""
+        return self.df[name].to_numpy()[self.positions(**selection)]
+
+
+@lru_cache(maxsize=None)
+def english_stopwords():
+    """The nltk english stopwords, loaded once."""
+    return frozenset(stopwords.words("english"))
+
+
+def product_query_tokens(text):
+    """Upper-cased words of text with punctuation removed and stopwords dropped.
+
+    Product names are tokenized the same way for brands and the product_tokens artifact.
+    """
+    words = PUNCTUATION_REGEX.sub("", text).lower().split(" ")
+    return [w.upper() for w in words if w and w not in english_stopwords()]
+
+
+def product_search_tokens(name):
+    """Tokens a product name is indexed under, as make_dataset.product_token_table indexes it.
+
+    These are its query tokens plus the pieces of its words split at punctuation,
+    e.g. QUORNSTYLE, QUORN and STYLE for QUORN-STYLE.
+    """
+    pieces = [
+        w.upper()
+        for w in PIECE_REGEX.split(name.lower())
+        if w and w not in english_stopwords()
+    ]
+    return list(dict.fromkeys(product_query_tokens(name) + pieces))
+
+
+class ProductIndex:
+    """Inverted index from product name tokens to the rows of a frame.
+
+    Rows are grouped by product once; a query then intersects the products of its
+    tokens and gathers their rows, without scanning the product column again.
+
+    Matching is by whole words: a product matches when every word of the query, with
+    punctuation removed and stopwords dropped, is one of its words with punctuation
+    removed or a piece of one split at punctuation. "QUORN" thus finds "QUORN-STYLE
+    PIECES" but, unlike a substring scan, not "QUORNS"; "THE VITAMIN SHOPPE" looks for
+    VITAMIN and SHOPPE.
+
+    Args:
+        df (pd.DataFrame): frame with a product column, the positions refer to it.
+        token_table (pd.DataFrame, optional): (token, product) pairs, e.g. the product_tokens
+            artifact of make_dataset. Built from the distinct products of df when not given.
+        column (str, optional): product column. Defaults to "product".
+    """
+
+    def __init__(self, df, token_table=None, column="product"):
+        assert isinstance(df, pd.DataFrame), "Check whether df is Pandas Dataframe or not."
+        self.df = df
+        codes, products = pd.factorize(df[column])
+        self._order = np.argsort(codes, kind="stable")
+        self._bounds = np.searchsorted(codes[self._order], np.arange(len(products) + 1))
+        self.products = pd.Index(products)
+
+        if token_table is None:
+            tokens = pd.Series(products, dtype=object).map(product_search_tokens)
+            token_table = pd.DataFrame({"token": tokens, "product": products}).explode("token")
+            token_table = token_table.dropna()
+        product_codes = self.products.get_indexer(token_table["product"])
+        known = product_codes >= 0
+        product_codes = product_codes[known]
+        token_groups = pd.Series(product_codes).groupby(
+            token_table["token"].to_numpy()[known]
+        )
+        self._token_products = {
+            token: np.unique(product_codes[positions])
+            for token, positions in token_groups.indices.items()
+        }
+
+    def product_codes(self, query):
+        """Codes (positions in products) of the products containing every token of query."""
+        tokens = product_query_tokens(query)
+        assert len(tokens) > 0, "Check whether query has at least one word besides stopwords."
+        empty = np.array([], dtype=np.intp)
+        codes = self._token_products.get(tokens[0], empty)
+        for token in tokens[1:]:
+            codes = np.intersect1d(codes, self._token_products.get(token, empty))
+        return codes
+
+    def positions(self, query):
+        """Sorted row positions of df whose product mentions every word of query.
+
+        Args:
+            query (str): product or brand words, e.g. "QUORN" or "NATURE'S BOUNTY".
+
+        Returns:
+            (np.ndarray): positions into df, in row order.
+        """
+        parts = [
+            self._order[self._bounds[code] : self._bounds[code + 1]]
+            for code in self.product_codes(query)
+        ]
+        if not parts:
+            return np.array([], dtype=np.intp)
+        return np.sort(np.concatenate(parts))
+
+    def rows(self, query):
+        """Rows of df whose product mentions query, see positions."""
+        return self.df.iloc[self.positions(query)]
+
+
+def product_drilldown(df, query, index=None):
+    """All rows of df whose product mentions every word of query.
+
+    Args:
+        df (pd.DataFrame): frame with a product column
+        query (str): product or brand words
+        index (ProductIndex, optional): index of df, built when not given. Defaults to None.
+
+    Returns:
+        (pd.DataFrame): matching rows of df
+    """
+    if index is None:
+        index = ProductIndex(df)
+    assert index.df is df, "Check whether index was built on df."
+    return index.rows(query)
+
+
+def period_counts(df, by=None, freq="M", cube_measure=None):
+    """Counts events per period, for every group at once, with empty periods as zeros.
+
+    One groupby over (group, period) is unstacked into a table and reindexed onto
+    the full period range, so all groups share the same x values.
+
+    Args:
+        df (pd.DataFrame): row level data with time_stamp, or a cube with month.
+        by (str, optional): column whose values become the table columns. Defaults to None.
+        freq (str, optional): "W", "M" or "Q"; a cube is monthly so only "M" and "Q" apply to it. Defaults to "M".
+        cube_measure (str, optional): cube column to sum ("events" or "reports"). Defaults to None.
+
+    Returns:
+        (pd.DataFrame): period start dates as index (named date), one column per group
+            or a single counts column when by is None.
+    """
+    assert freq in ("W", "M", "Q"), "Check whether freq is W, M or Q."
+    if cube_measure is None:
+        periods = df["time_stamp"].dt.to_period(freq)
+        values = df["time_stamp"].notna().astype(np.int64)
+    else:
+        assert freq != "W", "A cube is aggregated by month and cannot be counted weekly."
+        periods = df["month"].dt.to_period(freq)
+        values = df[cube_measure]
+
+    if by is None:
+        table = values.groupby(periods).sum().to_frame("counts")
+    else:
+        counts = values.groupby([df[by], periods], observed=True).sum()
+        table = counts.unstack(0, fill_value=0).sort_index(axis=1)
+
+    table.index = table.index.to_timestamp()
+    table.columns.name = None
+    return fill_periods(table, freq)
+
+
+def fill_periods(table, freq="M"):
+    """Reindexes a table of period start dates onto every period between its first and last.
+
+    Args:
+        table (pd.DataFrame): period start dates as index, possibly with gaps or NaN
+        freq (str, optional): "W", "M" or "Q". Defaults to "M".
+
+    Returns:
+        (pd.DataFrame): table with missing periods and NaN filled with zeros
+    """
+    if len(table) > 0:
+        full = pd.period_range(table.index.min(), table.index.max(), freq=freq)
+        table = table.fillna(0).reindex(full.to_timestamp(), fill_value=0)
+    table.index.name = "date"
+    return table
+
+
+def lttb_indices(x, y, n_out):
+    """Picks n_out points of a line with Largest-Triangle-Three-Buckets downsampling.
+
+    First and last points are always kept; every bucket in between keeps the point
+    forming the largest triangle with the previously kept point and the next bucket's mean.
+
+    Args:
+        x (np.ndarray): numeric x values, sorted ascending
+        y (np.ndarray): y values
+        n_out (int): number of points to keep
+
+    Returns:
+        (np.ndarray): sorted positions of the kept points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def line_traces(table, webgl_threshold=10000, max_points=None):
+    """Builds one line trace per column of a period_counts table.
+
+    Args:
+        table (pd.DataFrame): dates as index, one column per trace
+        webgl_threshold (int, optional): use go.Scattergl for every trace once the figure holds more points. Defaults to 10000.
+        max_points (int, optional): LTTB-downsample each trace to at most this many points. Defaults to None.
+
+    Returns:
+        (list): go.Scatter or go.Scattergl traces
+    """
+    total = table.shape[0] * table.shape[1]
+    trace = go.Scattergl if webgl_threshold is not None and total > webgl_threshold else go.Scatter
+    x = table.index.to_numpy()
+
+    traces = []
+    for name in table.columns:
+        y = table[name].to_numpy()
+        keep = slice(None)
+        if max_points is not None:
+            keep = lttb_indices(x.astype(np.int64), y, max_points)
+        traces.append(trace(x=x[keep], y=y[keep], mode="lines", name=str(name)))
+    return traces
+
+
+def compact_figure_json(fig):
+    """Serializes a figure with numeric trace arrays as base64 typed arrays.
+
+    Dates on x are stored as epoch milliseconds on a date axis, so lines with
+    thousands of points stay small. Needs plotly.js >= 2.28 to render, and the
+    pinned plotly.io cannot read it back; keep fig.to_json() for that. Pass the
+    built figure: one rebuilt from JSON holds its dates as strings.
+
+    Args:
+        fig (go.Figure): figure to serialize
+
+    Returns:
+        (str): figure JSON
+    """
+    spec = json.loads(fig.to_json())
+    for trace, source in zip(spec["data"], fig.data):
+        for axis in ("x", "y"):
+            values = getattr(source, axis, None)
+            if values is None:
+                continue
+            values = np.asarray(values)
+            if pd.api.types.infer_dtype(values, skipna=False) in ("datetime64", "datetime"):
+                values = pd.to_datetime(values).to_numpy().astype("datetime64[ms]")
+                values = values.astype(np.int64).astype(np.float64)
+                spec["layout"].setdefault(axis + "axis", {})["type"] = "date"
+            elif not np.issubdtype(values.dtype, np.number) or values.size == 0:
+                continue
+
+            if np.issubdtype(values.dtype, np.integer):
+                dtype = next(
+                    t
+                    for t in ("u1", "i1", "u2", "i2", "u4", "i4", "f8")
+                    if t == "f8"
+                    or (np.iinfo(t).min <= values.min() and values.max() <= np.iinfo(t).max)
+                )
+            else:
+                dtype = "f8"
+            values = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+            trace[axis] = {
+                "dtype": dtype,
+                "bdata": base64.b64encode(values.tobytes()).decode("ascii"),
+            }
+    return json.dumps(spec, separators=(",", ":"))
+
+
+def normalize_counts(counts, normalization="max"):
+    """Rescales a count series so groups of different size can share an axis.
+
+    Args:
+        counts (pd.Series): counts to rescale
+        normalization (str, optional): "max" divides by the peak, "total" by the sum,
+            "zscore" subtracts the mean and divides by the standard deviation. Defaults to "max".
+
+    Returns:
+        (pd.Series): rescaled counts, zeros when the scale is 0
+    """
+    assert normalization in ("max", "total", "zscore"), "Check whether normalization is max, total or zscore."
+    if normalization == "zscore":
+        counts = counts - counts.mean()
+        scale = counts.std(ddof=0)
+    elif normalization == "total":
+        scale = counts.sum()
+    else:
+        scale = counts.max()
+    if not scale or pd.isna(scale):
+        return counts * 0.0
+    return counts / scale
 
 
 def brands_vs_outcomes_plot(
@@ -18,14 +598,20 @@ def brands_vs_outcomes_plot(
         "Disability",
         "Patient Visited ER",
     ],
+    cube_measure=None,
+    return_fig=False,
+    index=None,
 ):
     """ This function plots histogram for the brand names for each category colored with respect to all outcomes.
 
     Args:
-        base_df (pd.DataFrame): Base dataframe with all data.
+        base_df (pd.DataFrame): Base dataframe with all data, or an aggregate cube.
         category (str): Category for which brands have to be plotted.
         title (str): Title of plot
         relv_outcomes (list, optional): Relevant serious outcomes which are considered. Defaults to [ "Death", "Life Threatening", "Hospitalization", "Disability", "Patient Visited ER", ].
+        cube_measure (str, optional): measure to sum when baseDf is an aggregate cube. Defaults to None.
+        return_fig (bool, optional): return (histogram, pie) figures instead of showing them. Defaults to False.
+        index (GroupIndex, optional): index of baseDf over category, shared with other plots. Defaults to None.
     """
 
     assert isinstance(
@@ -38,27 +624,18 @@ def brands_vs_outcomes_plot(
     ), "Check whether relv_outcomes is list or not."
     assert len(relv_outcomes) > 1, "Atleast 1 relevant outcome must be selected"
 
-    df = baseDf[
-        (baseDf["category"] == category) & (baseDf["product"] != "EXEMPTION 4")
-    ].copy()
-
-    df.dropna(inplace=True)
-
-    topBrandsGroup = (
-        df.groupby(["brand"])["report_id"].count().sort_values(ascending=False)
+    brand_counts, top_brands_df = brand_outcome_counts(
+        baseDf, category, relv_outcomes, cube_measure, index
     )
 
-    relv_brands = list(topBrandsGroup.reset_index()["brand"].values[:10])
-    relv_df = df[df["outcomes"].isin(relv_outcomes)]
-    relv_df = relv_df[relv_df["brand"].isin(relv_brands)]
-
-    relv_df = relv_df.rename(columns={"outcomes": "Outcomes"})
-
-    plot_bar_histogram(relv_df, title=title, x="brand", color="Outcomes")
-
-    df = df[df["outcomes"].isin(relv_outcomes)]
-    g_top = df.groupby(["brand"])["report_id"].count().sort_values(ascending=False)
-    top_brands_df = g_top.reset_index()[:10].rename(columns={"report_id": "#events"})
+    fig_hist = plot_bar_histogram(
+        brand_counts,
+        title=title,
+        x="brand",
+        color="Outcomes",
+        y="#events",
+        return_fig=return_fig,
+    )
 
     fig_pie = px.pie(
         top_brands_df,
@@ -69,11 +646,71 @@ def brands_vs_outcomes_plot(
         width=1200,
     )
     fig_pie.update_traces(textposition="inside", textinfo="percent+label")
+    if return_fig:
+        return fig_hist, fig_pie
     fig_pie.show()
 
 
+@cached_aggregate
+def brand_outcome_counts(
+    baseDf, category, relv_outcomes, cube_measure=None, index=None
+):
+    """Computes the aggregates plotted by brands_vs_outcomes_plot.
+
+    Args:
+        baseDf (pd.DataFrame): Base dataframe with all data, or an aggregate cube.
+        category (str): Category for which brands have to be counted.
+        relv_outcomes (list): Relevant serious outcomes which are considered.
+        cube_measure (str, optional): measure to sum when baseDf is an aggregate cube. Defaults to None.
+        index (GroupIndex, optional): index of baseDf over category. Defaults to None.
+
+    Returns:
+        (tuple): (#events per brand and Outcomes for the top 10 brands, top 10 brands by #events
+            over relevant outcomes)
+    """
+    if index is None:
+        df = baseDf[value_mask(baseDf["category"], category)]
+    else:
+        assert index.df is baseDf, "Check whether index was built on baseDf."
+        df = index.rows(category=category)
+
+    if cube_measure is None:
+        df = df[~value_mask(df["product"], "EXEMPTION 4")]
+        df = df.dropna(subset=[col for col in BRAND_COLUMNS if col in df])
+    else:
+        df = df[~df["redacted"] & df["complete"]]
+        df = df.dropna(subset=["month", "brand", "outcomes"])
+
+    topBrandsGroup = group_counts(df, "brand", cube_measure).sort_values(
+        ascending=False
+    )
+
+    relv_brands = list(topBrandsGroup.index[:10])
+    relv_df = df[value_mask(df["outcomes"], relv_outcomes)]
+    relv_df = relv_df[value_mask(relv_df["brand"], relv_brands)]
+
+    # Keep first-appearance order so bars and colors are laid out as with row level data.
+    grouped = relv_df.groupby(["brand", "outcomes"], sort=False, observed=True)
+    brand_counts = grouped.size() if cube_measure is None else grouped[cube_measure].sum()
+    brand_counts = brand_counts.rename("#events").reset_index()
+    brand_counts = brand_counts.rename(columns={"outcomes": "Outcomes"})
+
+    df = df[value_mask(df["outcomes"], relv_outcomes)]
+    g_top = group_counts(df, "brand", cube_measure).sort_values(ascending=False)
+    top_brands_df = g_top.rename("#events").reset_index()[:10]
+
+    return drop_unused_categories(brand_counts), drop_unused_categories(top_brands_df)
+
+
 def plot_bar_histogram(
-    df, title, x="brand", color="Outcomes", barmode="stack", logscale=False
+    df,
+    title,
+    x="brand",
+    color="Outcomes",
+    barmode="stack",
+    logscale=False,
+    y=None,
+    return_fig=False,
 ):
     """This function plots bar histogram for columnn in dataframe with color as another column.
 
@@ -84,6 +721,8 @@ def plot_bar_histogram(
         color (str, optional): column name for color. Defaults to "Outcomes".
         barmode (str, optional): bar mode-stack or group . Defaults to "stack".
         logscale (bool, optional): whether y-axis (count) has to be log-scaled or not. Defaults to False.
+        y (str, optional): column summed per bar instead of counting rows, e.g. a cube measure. Defaults to None.
+        return_fig (bool, optional): return the figure instead of showing it. Defaults to False.
     """
 
     assert isinstance(df, pd.DataFrame), "Check whether df is Pandas Dataframe or not."
@@ -95,6 +734,7 @@ def plot_bar_histogram(
     fig = px.histogram(
         df,
         x=x,
+        y=y,
         color=color,
         barmode=barmode,
         title=title,
@@ -114,17 +754,30 @@ def plot_bar_histogram(
         font=dict(family="Arial", size=14, color="#424242"),
     )
 
+    if return_fig:
+        return fig
     fig.show()
 
 
-def plot_time_trend(df, title, x_col="date", y_col="counts"):
+def plot_time_trend(
+    df,
+    title,
+    x_col="date",
+    y_col="counts",
+    cube_measure=None,
+    return_fig=False,
+    freq="M",
+):
     """This function returns a plot for time series of input df
 
     Args:
-        df(pd.DataFrame): input dataframe
+        df(pd.DataFrame): input dataframe, or an aggregate cube
         title(str): title of the graph
         x_col(str): x-axis column name
         y_col(str): y-axis column name
+        cube_measure(str): measure to sum when df is an aggregate cube
+        return_fig(bool): return the figure instead of showing it
+        freq(str): "W", "M" or "Q" periods
 
     Returns: the plotly figure for time series plot
 
@@ -133,28 +786,82 @@ def plot_time_trend(df, title, x_col="date", y_col="counts"):
     assert isinstance(title, str), "Check whether title is string"
     assert isinstance(x_col, str), "Check whether x_col is string"
     assert isinstance(y_col, str), "Check whether y_col is string"
-    year_month = pd.DataFrame(
-        df["time_stamp"].groupby(df.time_stamp.dt.to_period("M")).agg("count").items(),
-        columns=["date", "counts"],
-    ).sort_values(by=["date"])
-    year_month["date"] = year_month["date"].apply(lambda x: x.to_timestamp())
-    fig = px.line(year_month, x=x_col, y=y_col, title=title)
+    table = period_counts(df, freq=freq, cube_measure=cube_measure)
+    fig = time_trend_figure(table, title, x_col, y_col)
+    if return_fig:
+        return fig
     fig.show()
 
 
+def time_trend_figure(table, title, x_col="date", y_col="counts"):
+    """Line figure of a period_counts table, as drawn by plot_time_trend.
+
+    Args:
+        table (pd.DataFrame): period_counts result, e.g. from a backends.AggregationBackend
+        title (str): title of the graph
+        x_col (str, optional): x-axis column name. Defaults to "date".
+        y_col (str, optional): y-axis column name. Defaults to "counts".
+
+    Returns:
+        (go.Figure): the time series plot
+    """
+    return px.line(table.reset_index(), x=x_col, y=y_col, title=title)
+
+
+@cached_aggregate
+def yearly_value_counts(df, year_col, column_name, d_threshold=None, cube_measure=None):
+    """Counts events per (year, value of column_name) in one groupby pass.
+
+    Args:
+        df (pd.DataFrame): row level data, or an aggregate cube
+        year_col (str): column holding the year
+        column_name (str): column whose values are counted
+        d_threshold (float, optional): values below this share of their year's total are
+            merged into "Other". Defaults to None, keeping every value.
+        cube_measure (str, optional): measure to sum when df is an aggregate cube. Defaults to None.
+
+    Returns:
+        (pd.Series): counts indexed by (year, value), ascending within each year
+    """
+    counts = group_counts(df, [year_col, column_name], cube_measure)
+    counts = counts[counts > 0]
+    if d_threshold is not None:
+        totals = counts.groupby(level=0).transform("sum")
+        labels = counts.index.get_level_values(1).astype(object).where(
+            (counts >= totals * d_threshold).to_numpy(), "Other"
+        )
+        counts = counts.groupby(
+            [counts.index.get_level_values(0), labels], sort=False
+        ).sum()
+        counts.index.names = [year_col, column_name]
+    order = np.lexsort((counts.to_numpy(), counts.index.get_level_values(0)))
+    return counts.iloc[order]
+
+
 def plot_pie_subplots_yearly(
-    group, title, column_name, dropping=False, d_threshold=1 / 50
+    group,
+    title,
+    column_name,
+    dropping=False,
+    d_threshold=1 / 50,
+    cube_measure=None,
+    return_fig=False,
+    cols=3,
 ):
     """ This function returns subplots of yearly piechart for the input column name
 
+    One pie is drawn per year present in the data, on a grid of cols columns and as
+    many rows as needed.
+
     Args:
-        group(pd.core.groupby.generic.DataFrameGroupBy): input pandas groupby object
+        group(pd.core.groupby.generic.DataFrameGroupBy): input pandas groupby object, grouped by a year column
         title(str): title of the plot
         column_name(str): the column name of the data of interests
-        col_num(int): number of columns
-        row_num(int): number of rows
         dropping(bool): if the data needs to group data with respect to d_threshold to "Others"
-        d_threshold(float): dropping threshold
+        d_threshold(float): dropping threshold, as a share of the year's total
+        cube_measure(str): measure to sum when group is a yearly groupby of an aggregate cube
+        return_fig(bool): return the figure instead of showing it
+        cols(int): number of columns of the grid
 
     Returns: a subplot of pie charts
 
@@ -162,55 +869,71 @@ def plot_pie_subplots_yearly(
     assert isinstance(
         group, pd.core.groupby.generic.DataFrameGroupBy
     ), "Check whether group is Pandas groupby object"
+    assert isinstance(group.keys, str), "Check whether group is grouped by a single column."
     assert isinstance(title, str), "Check whether title is str."
     assert isinstance(column_name, str), "Check whether column_name is str or not."
     assert isinstance(dropping, bool), "Check whether dropping is bool."
     assert isinstance(d_threshold, float) and 0 < d_threshold < 1, (
         "Check whether d_threshold is float and between 0 " "and 1 "
     )
+    assert isinstance(cols, int) and cols > 0, "Check whether cols is a positive int."
+
+    counts = yearly_value_counts(
+        group.obj,
+        group.keys,
+        column_name,
+        d_threshold if dropping else None,
+        cube_measure,
+    )
+    years = counts.index.get_level_values(0)
+    year_list = list(years.unique().sort_values())
+    rows = max(-(-len(year_list) // cols), 1)
 
-    specs = np.full((6, 3), {"type": "pie"}).tolist()
     fig = make_subplots(
-        rows=6,
-        cols=3,
+        rows=rows,
+        cols=cols,
         start_cell="top-left",
-        specs=specs,
+        specs=[[{"type": "pie"}] * cols for _ in range(rows)],
         vertical_spacing=0.01,
         horizontal_spacing=0.01,
     )
-    row = 1
-    col = 1
-    for i in range(2004, 2021):
-        year_category = pd.DataFrame(
-            group.get_group(i)[column_name].value_counts().items(),
-            columns=[column_name, "counts"],
-        ).sort_values(by=["counts"])
-        total = year_category["counts"].sum()
-        if dropping:
-            year_category.loc[
-                year_category["counts"] < total / 50, column_name
-            ] = "Other"
+    bounds = np.flatnonzero(np.r_[True, years[1:] != years[:-1], True])
+    starts = dict(zip(years[bounds[:-1]], zip(bounds[:-1], bounds[1:])))
+    for i, year in enumerate(year_list):
+        lo, hi = starts[year]
+        year_counts = counts.iloc[lo:hi]
         fig.add_trace(
             go.Pie(
-                values=year_category["counts"],
-                labels=year_category[column_name],
+                values=year_counts.to_numpy(),
+                labels=year_counts.index.get_level_values(1),
                 textinfo="none",
-                title="%d" % i,
+                title=str(year),
             ),
-            row=row,
-            col=col,
+            row=i // cols + 1,
+            col=i % cols + 1,
         )
-        if col == 3:
-            col = 1
-            row += 1
-        else:
-            col += 1
-    fig.layout.update(title=title, height=1000, width=1000, hovermode="closest")
+    fig.layout.update(
+        title=title,
+        height=max(1000 * rows // 6, 400),
+        width=1000 * cols // 3,
+        hovermode="closest",
+    )
+    if return_fig:
+        return fig
     fig.show()
 
 
 def plot_scatters(
-    group, group_names, title, fil=False, filter_list=None, plot_now=False
+    group,
+    group_names,
+    title,
+    fil=False,
+    filter_list=None,
+    plot_now=False,
+    cube_measure=None,
+    webgl_threshold=10000,
+    max_points=None,
+    freq="M",
 ):
     """This function will return a scatter plot of the input group names, with respect to time
 
@@ -221,6 +944,10 @@ def plot_scatters(
         filter_list(list): the list of groups that needs to be dropped
         title(str): title of the graph
         plot_now(bool): if the plot needs to be plotted right now, if false, return the plotly object
+        cube_measure(str): measure to sum when group is a groupby of an aggregate cube
+        webgl_threshold(int): render with WebGL once the figure holds more points, None to never
+        max_points(int): LTTB-downsample every trace to at most this many points
+        freq(str): "W", "M" or "Q" periods
 
     Returns: a time series plot
 
@@ -237,27 +964,18 @@ def plot_scatters(
     ), "Check whether filter_list is only list or None."
     assert isinstance(plot_now, bool), "Check whether plot_now is a boolean."
     assert isinstance(title, str), "Check whether title is a string."
-    fig = go.Figure()
-    for i in range(len(group_names)):
-        if fil and group_names[i] in filter_list:
-            continue
-        outcome = group.get_group(group_names[i])
-        outcome_df = pd.DataFrame(
-            outcome["time_stamp"]
-            .groupby(outcome.time_stamp.dt.to_period("M"))
-            .agg("count")
-            .items(),
-            columns=["date", "counts"],
-        ).sort_values(by=["date"])
-        outcome_df["date"] = outcome_df["date"].apply(lambda x: x.to_timestamp())
-        fig.add_trace(
-            go.Scatter(
-                x=outcome_df["date"],
-                y=outcome_df["counts"],
-                mode="lines",
-                name=group_names[i],
-            )
+    names = [x for x in group_names if not (fil and x in filter_list)]
+    if isinstance(group.keys, str):
+        # Grouped by a column: count every group in a single pass.
+        table = period_counts(group.obj, group.keys, freq, cube_measure)[names]
+    else:
+        table = pd.concat(
+            [period_counts(group.get_group(x), None, freq, cube_measure)["counts"] for x in names],
+            axis=1,
+            keys=names,
         )
+        table = fill_periods(table, freq).astype(np.int64)
+    fig = go.Figure(line_traces(table, webgl_threshold, max_points))
     fig.update_traces(hoverinfo="text+name", mode="lines")
     fig.update_layout(title_text=title)
     fig.update_layout(legend=dict(font=dict(family="Times", size=15, color="black")))
@@ -272,11 +990,13 @@ def plot_scatters(
         return fig
 
 
-def get_quorn_pie(exploded_df):
+def get_quorn_pie(exploded_df, return_fig=False, index=None):
     """ This function will return a pie chart of product pie chart for Quorn
 
     Args:
         exploded_df(pd.DataFrame): the exploded_dataframe
+        return_fig(bool): return the figure instead of showing it
+        index(ProductIndex): product index of exploded_df, shared with other drilldowns
 
     Returns: the pie chart for quorn
 
@@ -284,27 +1004,29 @@ def get_quorn_pie(exploded_df):
     assert isinstance(
         exploded_df, pd.DataFrame
     ), "Check whether exploded_df is a pd DataFrame."
-    exploded_df = exploded_df.rename(columns={"product": "products"})
-    quorn = exploded_df[exploded_df.products.str.contains("QUORN") == True]
+    quorn = product_drilldown(exploded_df, "QUORN", index)
+    outcome_counts = quorn["outcomes"].value_counts()
     fig = go.Figure()
-    outcome_quorn = quorn.groupby("outcomes")
-    count = list(outcome_quorn["outcomes"].agg("count").sort_values(ascending=False))
-    outcomes = list(
-        outcome_quorn["outcomes"].agg("count").sort_values(ascending=False).index
-    )
     fig.add_trace(
         go.Pie(
-            values=count, labels=outcomes, textinfo="none", title="outcome from QUORN"
+            values=outcome_counts.tolist(),
+            labels=list(outcome_counts.index),
+            textinfo="none",
+            title="outcome from QUORN",
         )
     )
+    if return_fig:
+        return fig
     fig.show()
 
 
-def get_quorn_bar(exploded_df):
+def get_quorn_bar(exploded_df, return_fig=False, index=None):
     """This function will return a bar graph for Quorn analysis
 
     Args:
-        exploded_df(pd.DataFrame): the exploded_dataframe
+        exploded_df(pd.DataFrame): the exploded_dataframe, with a year column
+        return_fig(bool): return the figure instead of showing it
+        index(ProductIndex): product index of exploded_df, shared with other drilldowns
 
     Returns:the bar chart of quorn outcomes
 
@@ -312,20 +1034,39 @@ def get_quorn_bar(exploded_df):
     assert isinstance(
         exploded_df, pd.DataFrame
     ), "Check whether exploded_df is a pd DataFrame."
-    quorn = exploded_df[exploded_df.products.str.contains("QUORN") == True]
-    k = quorn[["outcomes", "year"]]
+    quorn = product_drilldown(exploded_df, "QUORN", index)
+    k = drop_unused_categories(quorn[["outcomes", "year"]])
     fig = px.histogram(
         k, x="year", color="outcomes", title="Outcome histogram for Quorn"
     )
+    if return_fig:
+        return fig
     fig.show()
 
 
-def plot_normalized_scatters(groups, group_names):
+def plot_normalized_scatters(
+    groups,
+    group_names,
+    cube_measure=None,
+    return_fig=True,
+    webgl_threshold=10000,
+    max_points=None,
+    normalization="max",
+    title="Normalized categories over time",
+    freq="M",
+):
     """ This function will return a normalized scatter plot over input groups
 
     Args:
-        df(pd.DataFrame): input dataframe
         groups(list): groups that want to plot and normalized
+        group_names(list): trace name of every group
+        cube_measure(str): measure to sum when the groups are slices of an aggregate cube
+        return_fig(bool): return the figure, or show it when False
+        webgl_threshold(int): render with WebGL once the figure holds more points, None to never
+        max_points(int): LTTB-downsample every trace to at most this many points
+        normalization(str): "max", "total" or "zscore", see normalize_counts
+        title(str): title of the graph
+        freq(str): "W", "M" or "Q" periods
 
     Returns:a normalized scatter over time over groups
 
@@ -337,37 +1078,75 @@ def plot_normalized_scatters(groups, group_names):
     assert isinstance(group_names, list) and all(
         isinstance(x, str) for x in group_names
     ), "Check whether group_names is list of string."
-    fig = go.Figure()
-    for i in range(len(group_names)):
-        cat = groups[i]
-        max_num = max(
-            cat["time_stamp"].groupby(cat.time_stamp.dt.to_period("M")).agg("count")
-        )
-        category_df = pd.DataFrame(
-            (
-                cat["time_stamp"].groupby(cat.time_stamp.dt.to_period("M")).agg("count")
-                / max_num
-            ).items(),
-            columns=["date", "counts"],
-        ).sort_values(by=["date"])
-        category_df["date"] = category_df["date"].apply(lambda x: x.to_timestamp())
-        fig.add_trace(
-            go.Scatter(
-                x=category_df["date"],
-                y=category_df["counts"],
-                mode="lines",
-                name=group_names[i],
-            )
-        )
+    assert len(groups) == len(group_names), "Check whether every group has a name."
+    assert isinstance(title, str), "Check whether title is a string."
+    # One aggregation per group, reused for the scale and the values.
+    table = pd.concat(
+        [period_counts(cat, None, freq, cube_measure)["counts"] for cat in groups],
+        axis=1,
+        keys=group_names,
+    )
+    table = fill_periods(table, freq)
+    table = table.apply(normalize_counts, normalization=normalization)
+    fig = go.Figure(line_traces(table, webgl_threshold, max_points))
     fig.update_traces(hoverinfo="text+name", mode="lines")
-    fig.update_layout(title_text="Normalized categories over time")
+    fig.update_layout(title_text=title)
     fig.update_layout(legend=dict(font=dict(family="Times", size=15, color="black")))
     fig.update_layout(
         xaxis_title="Date", font=dict(family="Times", size=15, color="#7f7f7f")
     )
+    if return_fig:
+        return fig
+    fig.show()
+
+
+@cached_aggregate
+def symptom_frequencies(
+    data, category=None, brand=None, product=None, exclude=None, index=None
+):
+    """Counts MedDRA preferred terms over the reports matching the given filters.
+
+    The terms column is split, exploded and counted in one pass; empty or missing
+    term strings are skipped like in symptom_counter.
+
+    Args:
+        data (pd.DataFrame): Data to be analyzed
+        category (str or list, optional): keep only these categories. Defaults to None.
+        brand (str or list, optional): keep only these brands. Defaults to None.
+        product (str or list, optional): keep only these products. Defaults to None.
+        exclude (list, optional): terms removed from the result if present. Defaults to None.
+        index (GroupIndex, optional): index of data; filters on its keys become lookups. Defaults to None.
+
+    Returns:
+        (pd.Series): count per term, in order of first occurrence
+    """
+    assert isinstance(data, pd.DataFrame), "data is not a DataFrame"
+
+    filters = {"category": category, "brand": brand, "product": product}
+    filters = {column: values for column, values in filters.items() if values is not None}
+    if index is not None:
+        assert index.df is data, "index was not built on data"
+        indexed = {k: v for k, v in filters.items() if k in index.keys}
+        if indexed:
+            data = index.rows(**indexed)
+            filters = {k: v for k, v in filters.items() if k not in indexed}
+
+    mask = np.ones(len(data), dtype=bool)
+    for column, values in filters.items():
+        mask &= value_mask(data[column], values)
+
+    terms = data["medra_preferred_terms"][mask]
+    terms = terms[terms.notna() & (terms != "")]
+    items = terms.str.split(",").explode().str.strip()
 
+    codes, uniques = pd.factorize(items)
+    counts = pd.Series(np.bincount(codes, minlength=len(uniques)), index=uniques)
+    if exclude is not None:
+        counts = counts.drop(exclude, errors="ignore")
+    return counts
 
-def symptom_counter(data: pd.DataFrame, variable: int = 0):
+
+def symptom_counter(data: pd.DataFrame, variable: int = 0, index=None):
     """This function will return a dictionary containing counts of each symptom present in data under a given condition, 
     dictated by variable
 
@@ -376,6 +1155,7 @@ def symptom_counter(data: pd.DataFrame, variable: int = 0):
         cosmetic (int): 0 -> all categories, all products
                         1 -> only for cosmetics as a categorie
                         2 -> only for quorn as a product
+        index (GroupIndex, optional): index of data over category and/or brand. Defaults to None.
 
     Returns:
         (dictionary): A dictionary with keys as symptoms and values as total count
@@ -387,36 +1167,27 @@ def symptom_counter(data: pd.DataFrame, variable: int = 0):
     assert (
         isinstance(variable, int) and 0 <= variable <= 2
     ), "variable is not an integer in the range [0,2]"
-    dic = defaultdict(int)
     if variable == 1:
-        data = data.drop(data.index[(data["category"] != "Cosmetics")])
+        # DEATH and INJURY are probably errors made by doctors, they should be outcomes not symptoms
+        counts = symptom_frequencies(
+            data, category="Cosmetics", exclude=["DEATH", "INJURY"], index=index
+        )
     elif variable == 2:
-        data = data.drop(data.index[(data["brand"] != "QUORN")])
-    for dat in data["medra_preferred_terms"]:
-        if dat == "" or pd.isnull(dat):
-            continue
-        lis = dat.split(",")
-        for i in lis:
-            i = i.strip()
-            dic[i] += 1
-    if variable == 1:
-        del dic[
-            "DEATH"
-        ]  # Since this is probably an error made by doctors, it should be an outcome not a symptom
-        del dic[
-            "INJURY"
-        ]  # Since this is probably an error made by doctors, it should be an outcome not a symptom
-    return dic
+        counts = symptom_frequencies(data, brand="QUORN", index=index)
+    else:
+        counts = symptom_frequencies(data)
+    return defaultdict(int, zip(counts.index, counts.tolist()))
 
 
-def top_symptoms(dic, title):
+def top_symptoms(dic, title, return_fig=False):
     """Find and plot top symptoms in the dictionary based on count
 
     Args:
         dic (dict): Dictionary containing text-count pair
+        return_fig (bool, optional): return the figure instead of showing it. Defaults to False.
 
     Returns:
-        [dictionary]: Top 5 symptoms with their count
+        [dictionary]: Top 5 symptoms with their count, the figure if return_fig
     """
     assert isinstance(dic, dict) and len(dic) > 0, "dic is not a nonempty dictionary"
     labels = []
@@ -441,65 +1212,173 @@ def top_symptoms(dic, title):
         margin=dict(l=20, r=20, t=50, b=20),
         legend=dict(font=dict(size=25, color="black")),
     )
+    if return_fig:
+        return fig
     fig.show()
     return top5
 
 
-def top_vitamins_symptom_distribution(data):
+@cached_aggregate
+def top_symptom_brands(
+    data,
+    category="Vit/Min/Prot/Unconv Diet(Human/Animal)",
+    symptom_list=["DIARRHOEA", "VOMITING", "NAUSEA", "ABDOMINAL PAIN"],
+    k=5,
+):
+    """Finds the k brands with most reports of each symptom within a category.
+
+    The terms column is exploded once for the whole category, counted per
+    (symptom, brand) and cut to the top k brands of every symptom.
+
+    Args:
+        data (pd.DataFrame): Data to be analyzed
+        category (str, optional): category of products. Defaults to "Vit/Min/Prot/Unconv Diet(Human/Animal)".
+        symptom_list (list, optional): symptoms of interest. Defaults to ["DIARRHOEA", "VOMITING", "NAUSEA", "ABDOMINAL PAIN"].
+        k (int, optional): brands kept per symptom. Defaults to 5.
+
+    Returns:
+        (pd.DataFrame): Products, Reported Cases and Symptom columns, ordered by symptom_list then count
+    """
+    # Strip the few distinct category names rather than every row.
+    codes, uniques = pd.factorize(data["category"])
+    in_category = np.isin(codes, np.flatnonzero(pd.Index(uniques).str.strip() == category))
+    df = data[in_category].assign(category=category).reset_index(drop=True)
+
+    # Exploded rows are duplicates when their report columns and raw term match,
+    # so dedup on (row hash, term) instead of on every exploded column.
+    row_keys = pd.util.hash_pandas_object(
+        df.drop(columns=["medra_preferred_terms"]), index=False
+    )
+    items = df["medra_preferred_terms"].str.split(",").explode()
+    df = pd.DataFrame(
+        {
+            "row_key": row_keys.to_numpy()[items.index],
+            "medra_preferred_terms": items.to_numpy(),
+            "brand": df["brand"].to_numpy()[items.index],
+        }
+    ).drop_duplicates(["row_key", "medra_preferred_terms"])
+    codes, uniques = pd.factorize(df["medra_preferred_terms"])
+    terms = pd.Series(
+        pd.Index(uniques).str.strip().to_numpy()[codes], index=df.index
+    ).where(codes != -1)
+
+    keep = terms.isin(symptom_list) & (df["brand"] != "EXEMPTION 4")
+    counts = (
+        pd.DataFrame({"Symptom": terms[keep], "Products": df["brand"][keep]})
+        .groupby(["Symptom", "Products"], sort=False, observed=True)
+        .size()
+        .rename("Reported Cases")
+        .reset_index()
+    )
+
+    counts["order"] = counts["Symptom"].map({s: i for i, s in enumerate(symptom_list)})
+    counts = counts.sort_values(
+        ["order", "Reported Cases"], ascending=[True, False], kind="stable"
+    )
+    top = counts.groupby("order", sort=False).head(k)
+    return top[["Products", "Reported Cases", "Symptom"]].reset_index(drop=True)
+
+
+def top_vitamins_symptom_distribution(
+    data,
+    category="Vit/Min/Prot/Unconv Diet(Human/Animal)",
+    symptom_list=["DIARRHOEA", "VOMITING", "NAUSEA", "ABDOMINAL PAIN"],
+    title="Top Vitamin Products Causing Symptoms ",
+    return_fig=False,
+):
     """This function will plot a histogram for Reported Cases vs Products, where Products are the top vitamin products causing the
     top 5 symptoms
 
     Args:
         data (pd.DataFrame): Data to be analyzed
+        category (str, optional): category of products. Defaults to "Vit/Min/Prot/Unconv Diet(Human/Animal)".
+        symptom_list (list, optional): symptoms of interest. Defaults to ["DIARRHOEA", "VOMITING", "NAUSEA", "ABDOMINAL PAIN"].
+        title (str, optional): title of the plot. Defaults to "Top Vitamin Products Causing Symptoms ".
+        return_fig (bool, optional): return the figure instead of showing it. Defaults to False.
     """
     assert (
         isinstance(data, pd.DataFrame) and len(data) > 0
     ), "data is either empty or a not a DataFrame"
-    fig = go.Figure()
-    symptom_list = ["DIARRHOEA", "VOMITING", "NAUSEA", "ABDOMINAL PAIN"]
-    data["category"] = data["category"].str.strip()
-    grouped_desc = data.groupby("category")
-    add_on_list = []
-    for symp in symptom_list:
-        grouped_desc_vit = grouped_desc.get_group(
-            "Vit/Min/Prot/Unconv Diet(Human/Animal)"
-        )
-        grouped_desc_vit["medra_preferred_terms"] = grouped_desc_vit[
-            "medra_preferred_terms"
-        ].str.split(",")
-        grouped_desc_vit = grouped_desc_vit.explode(
-            "medra_preferred_terms"
-        ).drop_duplicates()
-        grouped_desc_vit["medra_preferred_terms"] = grouped_desc_vit[
-            "medra_preferred_terms"
-        ].str.strip()
-        grouped_desc_vit2 = grouped_desc_vit.groupby("medra_preferred_terms")
-        grouped_desc_vit = grouped_desc_vit2.get_group(symp)
-        list_of_counts = grouped_desc_vit["brand"].value_counts()
-        list_of_counts = list_of_counts.reset_index()
-        i = list_of_counts[list_of_counts["index"] == "EXEMPTION 4"].index
-        list_of_counts = list_of_counts.drop(i)
-        prods = list(list_of_counts["index"])[:5]
-        quants = list(list_of_counts["brand"])[:5]
-        lis_symp = [symp] * 5
-        zipped = zip(prods, quants, lis_symp)
-        for lis in zipped:
-            add_on_list.append(list(lis))
+    assert isinstance(category, str), "Check whether category is string or not."
+    assert isinstance(symptom_list, list), "Check whether symptom_list is list or not."
 
-    df = pd.DataFrame(
-        list(add_on_list), columns=["Products", "Reported Cases", "Symptom"]
-    )
+    df = top_symptom_brands(data, category, symptom_list)
     fig = px.histogram(
-        df,
-        x="Products",
-        y="Reported Cases",
-        color="Symptom",
-        title="Top Vitamin Products Causing Symptoms ",
+        df, x="Products", y="Reported Cases", color="Symptom", title=title,
     )
     fig.update_layout(barmode="stack", bargap=0.1)
+    if return_fig:
+        return fig
     fig.show()
 
 
+@cached_aggregate
+def outcome_age_samples(baseDf, category, relv_outcomes, index=None):
+    """Collects patient_age of every report of category, per relevant outcome.
+
+    Args:
+        baseDf (pd.DataFrame): exploded data
+        category (string): Which category of products to collect ages for
+        relv_outcomes (list): outcomes to collect ages for
+        index (GroupIndex, optional): index of baseDf over category and outcomes,
+            built when not given. Defaults to None.
+
+    Returns:
+        (list): patient_age array per outcome, in the order of relv_outcomes. Outcomes
+            without reports for category give empty arrays.
+    """
+    if index is None:
+        index = GroupIndex(baseDf, ["category", "outcomes"])
+    assert index.df is baseDf, "Check whether index was built on baseDf."
+    return [
+        index.column("patient_age", category=category, outcomes=outcome).astype(float)
+        for outcome in relv_outcomes
+    ]
+
+
+def kde_curve(values, n_points=500, bin_size=None):
+    """Gaussian KDE of values with Scott's bandwidth, evaluated on a grid over their range.
+
+    Values are linearly binned onto the grid (extended by the point at their maximum)
+    first, so the cost is one pass over values plus a n_points x (n_points + 1) kernel,
+    whatever the number of samples.
+
+    Args:
+        values (np.ndarray): samples
+        n_points (int, optional): grid size. Defaults to 500.
+        bin_size (float, optional): scale the density by it, giving probability per bin
+            like histnorm="probability" histograms. Defaults to None.
+
+    Returns:
+        (tuple): (grid, density) arrays, or None when values have less than 2 distinct samples.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if len(values) < 2 or values.min() == values.max():
+        return None
+
+    lo, hi = values.min(), values.max()
+    grid = np.linspace(lo, hi, n_points, endpoint=False)
+    step = grid[1] - grid[0]
+
+    # The grid stops one step short of hi, so bin onto one extra point at hi.
+    centers = lo + step * np.arange(n_points + 1)
+    pos = (values - lo) / step
+    left = np.minimum(pos.astype(np.intp), n_points - 1)
+    frac = pos - left
+    weights = np.bincount(left, 1 - frac, n_points + 1) + np.bincount(
+        left + 1, frac, n_points + 1
+    )
+
+    bandwidth = values.std(ddof=1) * len(values) ** (-1 / 5)
+    offsets = (grid[:, None] - centers[None, :]) / bandwidth
+    density = np.exp(-0.5 * offsets ** 2) @ weights
+    density /= len(values) * bandwidth * np.sqrt(2 * np.pi)
+    if bin_size is not None:
+        density *= bin_size
+    return grid, density
+
+
 def age_dist_plot(
     baseDf,
     category,
@@ -510,13 +1389,24 @@ def age_dist_plot(
         "Disability",
         "Patient Visited ER",
     ],
+    return_fig=False,
+    index=None,
+    show_rug=True,
 ):
     """Plots a KDE plot for age distribution of reports across top outcomes for a given category
 
+    Laid out like ff.create_distplot(show_hist=False): the curves on top and a rug of
+    the ages below them. The rug marks every distinct age once, since repeated marks
+    at the same age are drawn on top of each other anyway. Outcomes with fewer than
+    2 distinct ages for category are left out of the plot.
+
     Args:
         baseDf ([type]): [description]
         category (string): Which category of products to plot age distribution for
         relv_outcomes (list, optional):Defaults to [ "Death", "Life Threatening", "Hospitalization", "Disability", "Patient Visited ER", ].
+        return_fig (bool, optional): return the figure instead of showing it. Defaults to False.
+        index (GroupIndex, optional): index of baseDf over category and outcomes, shared with other plots. Defaults to None.
+        show_rug (bool, optional): draw the rug of ages below the curves. Defaults to True.
     """
     assert isinstance(
         baseDf, pd.DataFrame
@@ -527,28 +1417,52 @@ def age_dist_plot(
     ), "Check whether relv_outcomes is list or not."
     assert len(relv_outcomes) > 1, "Atleast 1 relevant outcome must be selected"
 
-    outcome_age_dist = []
+    outcome_age_dist = outcome_age_samples(baseDf, category, relv_outcomes, index)
 
-    for outcome in relv_outcomes:
-        out_grp = (
-            baseDf.groupby("category")
-            .get_group(category)
-            .groupby("outcomes")
-            .get_group(outcome)
+    fig1 = go.Figure()
+    rugs = []
+    for i, (outcome, ages) in enumerate(zip(relv_outcomes, outcome_age_dist)):
+        curve = kde_curve(ages, bin_size=5)
+        if curve is None:
+            continue
+        color = DEFAULT_PLOTLY_COLORS[i % len(DEFAULT_PLOTLY_COLORS)]
+        fig1.add_trace(
+            go.Scatter(
+                x=curve[0],
+                y=curve[1],
+                mode="lines",
+                name=outcome,
+                legendgroup=outcome,
+                line=dict(color=color),
+            )
+        )
+        marks = np.unique(np.asarray(ages, dtype=float))
+        marks = marks[np.isfinite(marks)]
+        rugs.append(
+            go.Scatter(
+                x=marks,
+                y=[outcome] * len(marks),
+                xaxis="x",
+                yaxis="y2",
+                mode="markers",
+                name=outcome,
+                legendgroup=outcome,
+                showlegend=False,
+                marker=dict(color=color, symbol="line-ns-open"),
+            )
+        )
+    if show_rug:
+        fig1.add_traces(rugs)
+        fig1.update_layout(
+            xaxis=dict(domain=[0.0, 1.0], anchor="y2", zeroline=False),
+            yaxis=dict(domain=[0.35, 1], anchor="free", position=0.0),
+            yaxis2=dict(domain=[0, 0.25], anchor="x", dtick=1, showticklabels=False),
         )
-        outcome_age_dist.append(out_grp["patient_age"])
-
-    fig1 = ff.create_distplot(
-        outcome_age_dist,
-        relv_outcomes,
-        bin_size=5,
-        show_hist=False,
-        histnorm="probability",
-        curve_type="kde",
-    )
     fig1.update_layout(
         xaxis_title="Patient Age",
         yaxis_title="Probability Density",
         font=dict(family="Courier New, monospace", size=16, color="black",),
     )
+    if return_fig:
+        return fig1
     fig1.show()
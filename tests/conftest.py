@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from src.data.make_dataset import main as make_dataset
+from benchmarks.common import write_raw_csvs
+
+
+@pytest.fixture(scope="session")
+def raw_dir(tmp_path_factory):
+    """Three small synthetic raw CAERS csv files."""
+    path = tmp_path_factory.mktemp("raw")
+    write_raw_csvs(path, 3, 400, seed=0)
+    return path
+
+
+@pytest.fixture(scope="session")
+def processed_dir(raw_dir, tmp_path_factory):
+    """Every artifact of a default make_dataset run over raw_dir."""
+    path = tmp_path_factory.mktemp("processed")
+    make_dataset.main([str(raw_dir), str(path)], standalone_mode=False)
+    return path
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pytest
+
+from src.data.make_dataset import extract_brands, read_frame, write_frame
+from src.visualization.backends import AggregationBackend, PandasBackend
+from benchmarks.common import synthetic_reports
+from benchmarks.out_of_core import run_queries
+
+pytest.importorskip("pyarrow")
+from src.visualization.backends import ParquetBackend  # noqa: E402
+
+
+def test_aggregation_backend_is_abstract():
+    with pytest.raises(TypeError):
+        AggregationBackend()
+
+
+@pytest.mark.parametrize("batch_size", [1000, 1_000_000])
+def test_parquet_backend_matches_pandas_backend(tmp_path, batch_size):
+    df = synthetic_reports(5000, n_products=300, seed=4)
+    df["brand"] = extract_brands(df)
+    df["outcomes"] = df["outcomes"].str.split(",")
+    df = df.explode("outcomes", ignore_index=True)
+    df["outcomes"] = df["outcomes"].str.strip()
+    df = df.rename(columns={"caers_created_date": "time_stamp"})
+    path = write_frame(df, tmp_path, "exploded_data_time", "parquet")
+
+    # The in-memory side reads the same artifact, with the same categorical dtypes.
+    expected = run_queries(PandasBackend(read_frame(tmp_path, "exploded_data_time", "parquet")))
+    got = run_queries(ParquetBackend(path, batch_size))
+    for a, b in zip(got, expected):
+        if isinstance(a, pd.DataFrame):
+            pd.testing.assert_frame_equal(
+                a, b, check_column_type=False, check_categorical=False
+            )
+        else:
+            pd.testing.assert_series_equal(
+                a, b, check_index_type=False, check_categorical=False, check_names=False
+            )
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+import click
+import filecmp
+import json
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.make_dataset import (
+    MANIFEST_FILE,
+    STAGES,
+    age_preprocess,
+    brand_preprocess,
+    exploded_view,
+    extract_brands,
+    main as make_dataset,
+    normalize_ages,
+    read_categories,
+    read_frame,
+    write_frame,
+)
+from src.data.profiling import REPORT_FILE
+from src.data.schema import apply_schema
+from src.visualization import visualize as vis
+from benchmarks.common import synthetic_reports, write_raw_csvs
+
+
+def assert_same_artifacts(expected_dir, got_dir):
+    """Every artifact file of expected_dir exists in got_dir with the same bytes."""
+    def artifacts(path):
+        skip = {REPORT_FILE, MANIFEST_FILE}
+        return sorted(p.name for p in path.iterdir() if p.is_file() and p.name not in skip)
+
+    names = artifacts(expected_dir)
+    assert names == artifacts(got_dir)
+    _, mismatch, errors = filecmp.cmpfiles(expected_dir, got_dir, names, shallow=False)
+    assert not mismatch and not errors, "Artifacts differ: %s" % (mismatch + errors)
+
+
+@pytest.mark.parametrize("trim_len", [1, 2, 3])
+def test_extract_brands_matches_brand_preprocess(trim_len):
+    df = synthetic_reports(2000, n_products=300, seed=1)
+    # Missing, empty, stopword-only and punctuated products next to the synthetic ones.
+    df.loc[:4, "product"] = ["THE OF", "", "QUORN-STYLE  PIECES", "L'OREAL, PARIS", np.nan]
+    df.loc[:4, "category"] = "Nuts/Edible Seed"
+
+    expected = df.apply(brand_preprocess, axis=1, trim_len=trim_len)
+    got = extract_brands(df, trim_len=trim_len)
+    pd.testing.assert_series_equal(
+        got.fillna("<NA>"), expected.astype(object).fillna("<NA>"), check_names=False
+    )
+
+
+def test_normalize_ages_matches_age_preprocess():
+    df = pd.DataFrame(
+        {
+            "patient_age": [30.0, 6.0, 10.0, 2.0, 3.0, np.nan, 40.0, np.nan, 0.5],
+            "age_units": [
+                "year(s)",
+                "month(s)",
+                "day(s)",
+                "Decade(s)",
+                "week(s)",
+                "year(s)",
+                np.nan,
+                np.nan,
+                "month(s)",
+            ],
+        },
+        index=[10, 11, 12, 13, 14, 15, 16, 17, 18],
+    )
+    df = pd.concat([df, synthetic_reports(2000, seed=2)], ignore_index=False)
+
+    expected = df.apply(age_preprocess, axis=1)
+    pd.testing.assert_series_equal(
+        normalize_ages(df), expected.astype(float), check_exact=True
+    )
+
+
+def test_normalize_ages_unknown_unit(caplog):
+    df = pd.DataFrame(
+        {"patient_age": [5.0, 5.0, np.nan], "age_units": ["year(s)", "hour(s)", "hour(s)"]}
+    )
+    with pytest.raises(KeyError):
+        df.apply(age_preprocess, axis=1)
+
+    with caplog.at_level(logging.WARNING, logger="src.data.make_dataset"):
+        ages = normalize_ages(df)
+    assert ages.tolist() == [5.0, -1, -1]
+    assert "hour(s)" in caplog.text
+
+
+def test_exploded_view_reproduces_exploded_data(processed_dir):
+    categories = read_categories(processed_dir)
+    exploded = read_frame(processed_dir, "exploded_data", categories=categories)
+    view = exploded_view(
+        read_frame(processed_dir, "reports", categories=categories),
+        read_frame(processed_dir, "report_outcomes"),
+        read_frame(processed_dir, "outcome_codes", categories=categories),
+    )
+    pd.testing.assert_frame_equal(
+        view.drop(columns=["row_id"])[exploded.columns],
+        exploded,
+        check_dtype=False,
+        check_categorical=False,
+    )
+
+
+def test_bridge_counts_match_exploded_counts(processed_dir):
+    categories = read_categories(processed_dir)
+    exploded = read_frame(processed_dir, "exploded_data", categories=categories)
+    counts = vis.bridge_counts(
+        read_frame(processed_dir, "reports", categories=categories),
+        read_frame(processed_dir, "report_outcomes"),
+        read_frame(processed_dir, "outcome_codes", categories=categories),
+        by="category",
+    )
+    expected = vis.group_counts(exploded, ["category", "outcomes"])
+    assert counts.to_dict() == expected.to_dict()
+
+
+def test_incremental_run_matches_full_run(raw_dir, processed_dir, tmp_path, caplog):
+    args = [str(raw_dir), str(tmp_path), "--incremental"]
+    make_dataset.main(args, standalone_mode=False)
+    assert_same_artifacts(processed_dir, tmp_path)
+
+    with caplog.at_level(logging.INFO, logger="src.data.make_dataset"):
+        make_dataset.main(args, standalone_mode=False)
+    assert caplog.text.count("Reusing cached partition") == 3
+    assert_same_artifacts(processed_dir, tmp_path)
+
+    # Partitions built with other settings are not reused.
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger="src.data.make_dataset"):
+        make_dataset.main(args + ["--chunksize", "100"], standalone_mode=False)
+    assert "Reusing cached partition" not in caplog.text
+    assert "Partition settings changed" in caplog.text
+    assert_same_artifacts(processed_dir, tmp_path)
+
+
+def test_parallel_run_matches_serial_run(raw_dir, processed_dir, tmp_path):
+    make_dataset.main(
+        [str(raw_dir), str(tmp_path), "--workers", "2"], standalone_mode=False
+    )
+    assert_same_artifacts(processed_dir, tmp_path)
+
+
+@pytest.mark.parametrize("chunksize", [None, "70"])
+def test_parallel_run_splits_files_across_workers(raw_dir, processed_dir, tmp_path, chunksize):
+    # More workers than raw files: the chunks of every file are spread over the pool.
+    args = [str(raw_dir), str(tmp_path), "--workers", "4"]
+    if chunksize is not None:
+        args += ["--chunksize", chunksize]
+    make_dataset.main(args, standalone_mode=False)
+    assert_same_artifacts(processed_dir, tmp_path)
+
+
+def test_trace_malloc_run_traces_every_stage(raw_dir, processed_dir, tmp_path):
+    make_dataset.main(
+        [str(raw_dir), str(tmp_path), "--trace-malloc"], standalone_mode=False
+    )
+    stages = json.loads((tmp_path / REPORT_FILE).read_text())["stages"]
+    assert any(stage["stage"].startswith("write ") for stage in stages)
+    assert all("traced_peak_mb" in stage for stage in stages)
+    assert_same_artifacts(processed_dir, tmp_path)
+
+
+def test_report_stages_are_profile_choices(processed_dir):
+    stages = json.loads((processed_dir / REPORT_FILE).read_text())["stages"]
+    assert {stage["stage"] for stage in stages} <= set(STAGES)
+
+
+def test_profile_writes_stats_of_the_stage(raw_dir, tmp_path):
+    make_dataset.main(
+        [str(raw_dir), str(tmp_path), "--workers", "2", "--profile", "read+brand"],
+        standalone_mode=False,
+    )
+    assert (tmp_path / "profile_read+brand.pstats").exists()
+
+
+def test_profile_warns_when_the_stage_did_not_run(raw_dir, tmp_path, caplog):
+    with caplog.at_level(logging.WARNING, logger="src.data.profiling"):
+        make_dataset.main(
+            [str(raw_dir), str(tmp_path), "--workers", "2", "--profile", "brand"],
+            standalone_mode=False,
+        )
+    assert "Stage brand did not run" in caplog.text
+    assert not list(tmp_path.glob("*.pstats"))
+
+
+def test_profile_rejects_unknown_stages(raw_dir, tmp_path):
+    with pytest.raises(click.BadParameter):
+        make_dataset.main(
+            [str(raw_dir), str(tmp_path), "--profile", "brands"], standalone_mode=False
+        )
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_empty_brand_round_trips_through_code_tables(tmp_path, fmt):
+    raw_dir, out_dir = tmp_path / "raw", tmp_path / "processed"
+    raw_dir.mkdir()
+    (path,) = write_raw_csvs(raw_dir, 1, 200, seed=5)
+    raw = pd.read_csv(path)
+    # A product made only of stopwords has the empty brand.
+    raw.loc[0, "Product"] = "THE OF"
+    raw.to_csv(path, index=False)
+    make_dataset.main([str(raw_dir), str(out_dir), "--format", fmt], standalone_mode=False)
+
+    categories = read_categories(out_dir, fmt)
+    assert "" in categories["brand"]
+    assert not any(pd.isna(value) for values in categories.values() for value in values)
+    processed = read_frame(out_dir, "processed_data", fmt, categories)
+    assert list(processed["brand"].cat.categories[: len(categories["brand"])]) == categories["brand"]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "feather"])
+def test_write_frame_round_trips_dtypes_and_values(tmp_path, fmt):
+    df = pd.DataFrame(
+        {
+            "report_id": [7, 40000, 12, 7],
+            "row_id": [0.0, np.nan, 2.0, 3.0],
+            "year": [2004, 2023, 1999, 2010],
+            "patient_age": [30.5, np.nan, 1 / 3, -1.0],
+            "category": ["Cosmetics", "Nuts/Edible Seed", None, "Cosmetics"],
+            "brand": ["QUORN", "NEW BRAND", "QUORN", None],
+            "caers_created_date": pd.to_datetime(
+                ["2004-01-02", "2023-12-31", None, "2010-06-15"]
+            ),
+            "medra_preferred_terms": ["RASH, NAUSEA", None, "NAUSEA", "VOMITING"],
+            "score": [0.1, 2.5, np.nan, 4.0],
+        }
+    )
+    categories = {"category": ["Cosmetics", "Nuts/Edible Seed"], "brand": ["QUORN"]}
+    write_frame(df, tmp_path, "frame", fmt, categories)
+    got = read_frame(tmp_path, "frame", fmt, categories)
+
+    expected = apply_schema(df, categories)
+    assert got.dtypes.astype(str).to_dict() == {
+        "report_id": "Int32",
+        "row_id": "Int8",
+        "year": "Int16",
+        "patient_age": "float32",
+        "category": "category",
+        "brand": "category",
+        "caers_created_date": "datetime64[ns]",
+        "medra_preferred_terms": "object",
+        "score": "float64",
+    }
+    # Code table values keep their codes, unknown values come after them.
+    assert list(got["brand"].cat.categories) == ["QUORN", "NEW BRAND"]
+    pd.testing.assert_frame_equal(got, expected)
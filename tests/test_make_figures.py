@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+import pytest
+
+from src.data.make_dataset import main as make_dataset
+from src.visualization import make_figures
+from src.visualization import visualize as vis
+from src.visualization.make_figures import REPORT_FIGURES, write_figure
+
+
+def test_write_figure_json_formats(tmp_path):
+    dates = pd.to_datetime(["2020-01-05", "2020-03-02", "2020-03-09", "2020-06-01"])
+    fig = vis.plot_time_trend(pd.DataFrame({"time_stamp": dates}), "trend", return_fig=True)
+    stem = str(tmp_path / "trend")
+    write_figure(fig.to_json(), stem, ["json", "compact_json"], vis.compact_figure_json(fig))
+
+    # Plain json reads back with plotly.io.
+    back = pio.read_json(stem + ".json")
+    assert list(back.data[0].y) == [1, 0, 2, 0, 0, 1]
+
+    # Compact json holds the dates as epoch milliseconds on a date axis.
+    spec = json.loads((tmp_path / "trend.compact.json").read_text())
+    x = spec["data"][0]["x"]
+    got = np.frombuffer(base64.b64decode(x["bdata"]), dtype=np.dtype(x["dtype"]).newbyteorder("<"))
+    months = pd.period_range("2020-01", "2020-06", freq="M").to_timestamp()
+    np.testing.assert_array_equal(got, months.to_numpy().astype("datetime64[ms]").astype(np.int64))
+    assert spec["layout"]["xaxis"]["type"] == "date"
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "feather"])
+def test_report_figures_are_all_written(raw_dir, tmp_path, monkeypatch, fmt):
+    processed, figures = tmp_path / "processed", tmp_path / "figures"
+    processed.mkdir()
+    make_dataset.main([str(raw_dir), str(processed), "--format", fmt], standalone_mode=False)
+
+    # plotly express groups with observed=False: unused categories become empty groups.
+    def checked(plot):
+        def plot_frame(data_frame, *args, **kwargs):
+            for col in data_frame.columns:
+                if isinstance(data_frame[col].dtype, pd.CategoricalDtype):
+                    present = data_frame[col].dropna().unique()
+                    assert len(present) == len(data_frame[col].cat.categories), col
+            return plot(data_frame, *args, **kwargs)
+
+        return plot_frame
+
+    for name in ["histogram", "pie", "line"]:
+        monkeypatch.setattr(px, name, checked(getattr(px, name)))
+
+    make_figures.main(
+        [str(processed), str(figures), "--data-format", fmt, "--format", "json"],
+        standalone_mode=False,
+    )
+    for spec in REPORT_FIGURES:
+        assert list(figures.glob(spec["name"] + "*.json")), spec["name"]
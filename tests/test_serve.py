@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import logging
+import pytest
+
+from src.visualization import serve
+
+
+def answer(path, query, data=None):
+    status, body = asyncio.run(serve.AggregateServer(data).answer(path, query))
+    return status, json.loads(body)
+
+
+@pytest.mark.parametrize(
+    "path, query, error",
+    [
+        ("/brands_outcomes", "", "missing parameter category"),
+        ("/age_distribution", "top=3", "unknown parameter top"),
+        ("/symptoms", "variable=3", "bad parameter variable"),
+        ("/symptoms", "variable=-1", "bad parameter variable"),
+        ("/symptoms", "variable=one", "bad parameter variable"),
+        ("/symptoms", "top=0", "bad parameter top"),
+        ("/time_trend", "freq=D", "bad parameter freq"),
+        ("/time_trend", "freq=M&freq=Q", "repeated parameter freq"),
+    ],
+)
+def test_invalid_query_is_rejected_before_dispatch(path, query, error):
+    # No data is loaded: a dispatched view would fail with a 500.
+    status, body = answer(path, query)
+    assert status == 400
+    assert body["error"].startswith(error)
+
+
+def test_failing_view_is_logged_as_server_error(monkeypatch, caplog):
+    def failing_view(data, variable=0, top=20):
+        raise KeyError("medra_preferred_terms")
+
+    monkeypatch.setitem(
+        serve.ROUTES, "/symptoms", (failing_view, serve.ROUTES["/symptoms"][1])
+    )
+    with caplog.at_level(logging.ERROR, logger="src.visualization.serve"):
+        status, body = answer("/symptoms", "variable=1&top=5")
+    assert status == 500
+    assert "medra_preferred_terms" in body["error"]
+    assert "failed" in caplog.text
+
+
+def test_valid_query_reaches_view(monkeypatch):
+    def echo_view(data, variable=0, top=20):
+        return {"variable": variable, "top": top}
+
+    monkeypatch.setitem(
+        serve.ROUTES, "/symptoms", (echo_view, serve.ROUTES["/symptoms"][1])
+    )
+    assert answer("/symptoms", "variable=2&top=5") == (200, {"variable": 2, "top": 5})
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.make_dataset import (
+    BRAND_COLUMNS,
+    build_cube,
+    extract_brands,
+    product_token_table,
+)
+from src.visualization import visualize as vis
+from benchmarks.common import synthetic_reports
+from benchmarks.symptom_distribution import legacy_top_symptom_brands
+
+
+def legacy_symptom_counter(data, variable=0):
+    """symptom_counter as it was before the vectorized engine."""
+    dic = defaultdict(int)
+    if variable == 1:
+        data = data.drop(data.index[(data["category"] != "Cosmetics")])
+    elif variable == 2:
+        data = data.drop(data.index[(data["brand"] != "QUORN")])
+    for dat in data["medra_preferred_terms"]:
+        if dat == "" or pd.isnull(dat):
+            continue
+        for i in dat.split(","):
+            dic[i.strip()] += 1
+    if variable == 1:
+        del dic["DEATH"]
+        del dic["INJURY"]
+    return dic
+
+
+@pytest.fixture(scope="module")
+def reports():
+    df = synthetic_reports(3000, n_products=200, seed=3)
+    df.loc[:9, "medra_preferred_terms"] = ["", np.nan, " RASH ,NAUSEA", "NAUSEA"] + [""] * 6
+    df["brand"] = extract_brands(df)
+    return df
+
+
+@pytest.mark.parametrize("variable", [0, 1, 2])
+def test_symptom_counter_matches_legacy_loop(reports, variable):
+    expected = legacy_symptom_counter(reports, variable)
+    got = vis.symptom_counter(reports, variable)
+    # Same counts in the same key order.
+    assert list(got.items()) == list(expected.items())
+
+
+def test_cached_aggregate_keys_on_content(reports):
+    vis.AGGREGATE_CACHE.clear()
+    df = reports.copy()
+
+    first = vis.symptom_frequencies(df, category="Cosmetics")
+    assert vis.symptom_frequencies(df, category="Cosmetics") is first
+    assert vis.symptom_frequencies(df, category="Cosmetics", exclude=["DEATH"]) is not first
+    # Another object with the same content shares the aggregate.
+    assert vis.symptom_frequencies(df.copy(), category="Cosmetics") is first
+    assert vis.AGGREGATE_CACHE.info()["hits"] == 2
+
+
+def test_cached_aggregate_misses_after_in_place_edit(reports):
+    vis.AGGREGATE_CACHE.clear()
+    df = reports.copy()
+    first = vis.symptom_frequencies(df, category="Cosmetics")
+
+    rows = df.index[df["category"] == "Cosmetics"][:50]
+    df.loc[rows, "medra_preferred_terms"] = "RASH"
+    edited = vis.symptom_frequencies(df, category="Cosmetics")
+    assert edited is not first
+    assert vis.AGGREGATE_CACHE.info()["misses"] == 2
+    pd.testing.assert_series_equal(
+        edited, vis.symptom_frequencies.__wrapped__(df, category="Cosmetics")
+    )
+
+
+PRODUCTS = pd.DataFrame(
+    {
+        "product": [
+            "ALL BRAN FLAKES",
+            "THE VITAMIN SHOPPE MULTI",
+            "NO FEAR ENERGY",
+            "QUORN-STYLE PIECES",
+            "QUORN MEATLESS PIECES",
+            "QUORNS",
+            "NATURE'S BOUNTY D3",
+            np.nan,
+            "QUORN MEATLESS PIECES",
+        ]
+    }
+)
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("ALL BRAN", [0]),
+        ("THE VITAMIN SHOPPE", [1]),
+        ("NO FEAR", [2]),
+        ("QUORN", [3, 4, 8]),
+        ("QUORN-STYLE", [3]),
+        ("NATURE'S BOUNTY", [6]),
+    ],
+)
+def test_product_index_same_matches_with_and_without_artifact(query, expected):
+    from_artifact = vis.ProductIndex(PRODUCTS, product_token_table(PRODUCTS["product"]))
+    assert from_artifact.positions(query).tolist() == expected
+    assert vis.ProductIndex(PRODUCTS).positions(query).tolist() == expected
+
+
+def test_product_token_table_matches_product_search_tokens(reports):
+    products = pd.concat([PRODUCTS["product"], reports["product"]], ignore_index=True)
+    table = product_token_table(products)
+    expected = {
+        (token, product)
+        for product in products.dropna().unique()
+        for token in vis.product_search_tokens(product)
+    }
+    assert set(zip(table["token"], table["product"])) == expected
+
+
+def reference_period_counts(df, by, freq):
+    """Counts per (period, group) with a plain groupby, on every period of the range."""
+    periods = df["time_stamp"].dt.to_period(freq)
+    keys = [periods] if by is None else [periods, df[by]]
+    counts = df.groupby(keys).size()
+    table = counts.to_frame("counts") if by is None else counts.unstack(fill_value=0)
+    full = pd.period_range(periods.min(), periods.max(), freq=freq)
+    table = table.reindex(full, fill_value=0)
+    table.index = table.index.to_timestamp()
+    return table
+
+
+@pytest.mark.parametrize("freq", ["W", "M", "Q"])
+@pytest.mark.parametrize("by", [None, "category"])
+def test_period_counts_matches_groupby_reference(reports, by, freq):
+    df = reports.rename(columns={"caers_created_date": "time_stamp"})
+    table = vis.period_counts(df, by=by, freq=freq)
+    expected = reference_period_counts(df, by, freq)
+    assert table.index.name == "date"
+    assert table.index.tolist() == expected.index.tolist()
+    assert list(table.columns) == sorted(expected.columns)
+    assert (table.to_numpy() == expected[table.columns].to_numpy()).all()
+
+
+def test_period_counts_fills_gaps_with_zeros():
+    df = pd.DataFrame(
+        {
+            "time_stamp": pd.to_datetime(
+                ["2010-01-05", "2010-01-20", "2010-04-02", "2010-11-30"]
+            ),
+            "category": ["Cosmetics", "Cosmetics", "Nuts/Edible Seed", "Cosmetics"],
+        }
+    )
+    monthly = vis.period_counts(df)
+    assert monthly.index[0] == pd.Timestamp("2010-01-01")
+    assert monthly["counts"].tolist() == [2, 0, 0, 1, 0, 0, 0, 0, 0, 0, 1]
+
+    quarterly = vis.period_counts(df, by="category", freq="Q")
+    assert quarterly.index.tolist() == list(pd.date_range("2010-01-01", periods=4, freq="QS"))
+    assert quarterly["Cosmetics"].tolist() == [2, 0, 0, 1]
+    assert quarterly["Nuts/Edible Seed"].tolist() == [0, 1, 0, 0]
+
+
+@pytest.fixture(scope="module")
+def exploded_reports():
+    """Exploded synthetic reports with missing values in and outside the brand columns."""
+    df = synthetic_reports(4000, n_products=60, seed=6)
+    df["brand"] = extract_brands(df)
+    df.loc[df.index % 17 == 0, "sex"] = np.nan
+    df.loc[df.index % 13 == 0, "medra_preferred_terms"] = np.nan
+    df.loc[df.index % 29 == 0, "report_id"] = np.nan
+    df.loc[df.index % 31 == 0, "product"] = "EXEMPTION 4"
+    df["outcomes"] = df["outcomes"].str.split(",")
+    df = df.explode("outcomes")
+    df["outcomes"] = df["outcomes"].str.strip()
+    return df
+
+
+def figure_traces(fig):
+    return [(trace.name, list(trace.x), list(trace.y)) for trace in fig.data]
+
+
+def test_brand_columns_match_make_dataset():
+    assert vis.BRAND_COLUMNS == BRAND_COLUMNS
+
+
+@pytest.mark.parametrize("category", ["Cosmetics", "Vit/Min/Prot/Unconv Diet(Human/Animal)"])
+def test_brand_outcome_counts_cube_matches_rows(exploded_reports, category):
+    outcomes = ["Hospitalization", "Death", "Life Threatening", "Disability"]
+    cube = build_cube(exploded_reports)
+    for rows in [exploded_reports, exploded_reports[BRAND_COLUMNS].dropna()]:
+        expected = vis.brand_outcome_counts(rows, category, outcomes)
+        got = vis.brand_outcome_counts(cube, category, outcomes, cube_measure="events")
+        for a, b in zip(got, expected):
+            key = list(a.columns[:-1])
+            pd.testing.assert_frame_equal(
+                a.sort_values(key, ignore_index=True).astype({col: str for col in key}),
+                b.sort_values(key, ignore_index=True).astype({col: str for col in key}),
+            )
+
+
+def test_time_trend_cube_matches_rows(exploded_reports):
+    rows = exploded_reports.rename(columns={"caers_created_date": "time_stamp"})
+    reports = rows[~rows.index.duplicated()]
+    cube = build_cube(rows, "time_stamp")
+    for freq in ["M", "Q"]:
+        for measure, df in [("events", rows), ("reports", reports)]:
+            expected = vis.plot_time_trend(df, "trend", return_fig=True, freq=freq)
+            got = vis.plot_time_trend(
+                cube, "trend", cube_measure=measure, return_fig=True, freq=freq
+            )
+            assert figure_traces(got) == figure_traces(expected)
+
+
+def test_scatters_cube_matches_rows(exploded_reports):
+    rows = exploded_reports.rename(columns={"caers_created_date": "time_stamp"})
+    cube = build_cube(rows, "time_stamp")
+    names = ["Cosmetics", "Nuts/Edible Seed", "Soft Drink/Water"]
+    expected = vis.plot_scatters(rows.groupby("category"), names, "scatters")
+    got = vis.plot_scatters(cube.groupby("category"), names, "scatters", cube_measure="events")
+    assert figure_traces(got) == figure_traces(expected)
+
+    groups = [rows[rows["category"] == name] for name in names]
+    cube_groups = [cube[cube["category"] == name] for name in names]
+    for normalization in ["max", "total", "zscore"]:
+        expected = vis.plot_normalized_scatters(
+            groups, names, normalization=normalization, return_fig=True
+        )
+        got = vis.plot_normalized_scatters(
+            cube_groups, names, "events", normalization=normalization, return_fig=True
+        )
+        for (name, x, y), (name_e, x_e, y_e) in zip(figure_traces(got), figure_traces(expected)):
+            assert (name, x) == (name_e, x_e)
+            np.testing.assert_allclose(y, y_e)
+
+
+def test_pie_subplots_yearly_cube_matches_rows(exploded_reports):
+    rows = exploded_reports.assign(year=exploded_reports["caers_created_date"].dt.year)
+    cube = build_cube(rows)
+    cube["year"] = cube["month"].dt.year
+    expected = vis.plot_pie_subplots_yearly(
+        rows.groupby("year"), "pies", "outcomes", dropping=True, return_fig=True
+    )
+    got = vis.plot_pie_subplots_yearly(
+        cube.groupby("year"), "pies", "outcomes", True, cube_measure="events", return_fig=True
+    )
+    assert [(t.title.text, list(t.labels), list(t.values)) for t in got.data] == [
+        (t.title.text, list(t.labels), list(t.values)) for t in expected.data
+    ]
+
+
+@pytest.mark.parametrize(
+    "normalization, expected",
+    [
+        ("max", [0.0, 0.5, 1.0, 0.5]),
+        ("total", [0.0, 0.25, 0.5, 0.25]),
+        ("zscore", [-(2 ** 0.5), 0.0, 2 ** 0.5, 0.0]),
+    ],
+)
+def test_normalize_counts_modes(normalization, expected):
+    counts = pd.Series([0, 2, 4, 2])
+    np.testing.assert_allclose(vis.normalize_counts(counts, normalization), expected)
+
+
+@pytest.mark.parametrize("normalization", ["max", "total", "zscore"])
+def test_normalize_counts_zero_scale(normalization):
+    # All-zero counts have no scale, and constant counts have no spread.
+    assert vis.normalize_counts(pd.Series([0, 0, 0]), normalization).tolist() == [0.0] * 3
+    if normalization == "zscore":
+        assert vis.normalize_counts(pd.Series([3, 3, 3]), normalization).tolist() == [0.0] * 3
+    assert vis.normalize_counts(pd.Series([], dtype=float), normalization).empty
+
+
+def test_plot_normalized_scatters_returns_figure():
+    df = pd.DataFrame(
+        {"time_stamp": pd.to_datetime(["2010-01-03", "2010-01-20", "2010-03-02"])}
+    )
+    fig = vis.plot_normalized_scatters([df, df.iloc[:1]], ["a", "b"], normalization="total")
+    assert [trace.name for trace in fig.data] == ["a", "b"]
+    assert list(fig.data[0].y) == [2 / 3, 0.0, 1 / 3]
+    assert list(fig.data[1].y) == [1.0, 0.0, 0.0]
+
+
+def direct_kde(values, grid):
+    """Gaussian KDE with Scott's bandwidth summed over every sample, without binning."""
+    bandwidth = values.std(ddof=1) * len(values) ** (-1 / 5)
+    offsets = (grid[:, None] - values[None, :]) / bandwidth
+    return np.exp(-0.5 * offsets ** 2).sum(axis=1) / (len(values) * bandwidth * np.sqrt(2 * np.pi))
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_kde_curve_matches_direct_kde(seed):
+    rng = np.random.default_rng(seed)
+    ages = np.concatenate([rng.normal(35, 12, 1500), rng.integers(60, 90, 500)])
+    grid, density = vis.kde_curve(ages)
+    expected = direct_kde(ages, grid)
+    np.testing.assert_allclose(density, expected, rtol=0, atol=1e-4 * expected.max())
+
+    _, binned = vis.kde_curve(ages, bin_size=5)
+    np.testing.assert_allclose(binned, density * 5)
+
+
+def test_kde_curve_needs_two_distinct_samples():
+    assert vis.kde_curve([]) is None
+    assert vis.kde_curve([4.0, 4.0, np.nan]) is None
+
+
+def test_age_dist_plot_draws_a_rug_per_curve():
+    df = pd.DataFrame(
+        {
+            "category": ["Vit/Min/Prot/Unconv Diet(Human/Animal)"] * 6,
+            "outcomes": ["Death", "Death", "Death", "Hospitalization", "Disability", "Disability"],
+            "patient_age": [30.0, 30.0, 45.0, 50.0, 20.0, 70.0],
+        }
+    )
+    fig = vis.age_dist_plot(df, df["category"][0], return_fig=True)
+    curves = [t for t in fig.data if t.mode == "lines"]
+    rugs = [t for t in fig.data if t.mode == "markers"]
+    # Hospitalization has a single age and gets neither a curve nor a rug.
+    assert [t.name for t in curves] == ["Death", "Disability"]
+    assert [t.name for t in rugs] == ["Death", "Disability"]
+    assert [list(t.x) for t in rugs] == [[30.0, 45.0], [20.0, 70.0]]
+    assert all(t.yaxis == "y2" and not t.showlegend for t in rugs)
+    assert [t.line.color for t in curves] == [t.marker.color for t in rugs]
+
+    fig = vis.age_dist_plot(df, df["category"][0], return_fig=True, show_rug=False)
+    assert [t.mode for t in fig.data] == ["lines", "lines"]
+
+
+def assert_same_top_brands(got, expected, data, k=5):
+    """Same counts per symptom; brands may only differ among ties at the k-th count."""
+    assert got["Symptom"].tolist() == expected["Symptom"].tolist()
+    assert got["Reported Cases"].tolist() == expected["Reported Cases"].tolist()
+    full = legacy_top_symptom_brands(data, symptom_list=list(got["Symptom"].unique()), k=10 ** 6)
+    for symptom, rows in got.groupby("Symptom"):
+        cut = rows["Reported Cases"].min() if len(rows) == k else 0
+        legacy = expected[expected["Symptom"] == symptom]
+        assert set(rows.loc[rows["Reported Cases"] > cut, "Products"]) == set(
+            legacy.loc[legacy["Reported Cases"] > cut, "Products"]
+        )
+        counts = full[full["Symptom"] == symptom].set_index("Products")["Reported Cases"]
+        assert all(counts[b] == n for b, n in zip(rows["Products"], rows["Reported Cases"]))
+
+
+@pytest.mark.parametrize("seed", [3, 4])
+def test_top_symptom_brands_matches_legacy_loop(seed):
+    df = synthetic_reports(3000, n_products=200, seed=seed)
+    df["brand"] = extract_brands(df)
+    got = vis.top_symptom_brands(df)
+    assert_same_top_brands(got, legacy_top_symptom_brands(df), df)
+
+
+def test_top_symptom_brands_ties():
+    vitamins = "Vit/Min/Prot/Unconv Diet(Human/Animal)"
+    df = pd.DataFrame(
+        {
+            "report_id": range(7),
+            "category": [" " + vitamins] * 6 + ["Cosmetics"],
+            "brand": ["B", "A", "A", "B", "C", "EXEMPTION 4", "D"],
+            "medra_preferred_terms": [
+                "NAUSEA",
+                "NAUSEA, VOMITING",
+                "NAUSEA",
+                "NAUSEA ,VOMITING",
+                "VOMITING",
+                "NAUSEA",
+                "NAUSEA",
+            ],
+        }
+    )
+    got = vis.top_symptom_brands(df, symptom_list=["VOMITING", "NAUSEA"], k=2)
+    # Tied brands keep their first-occurrence order.
+    assert got.values.tolist() == [
+        ["A", 1, "VOMITING"],
+        ["B", 1, "VOMITING"],
+        ["B", 2, "NAUSEA"],
+        ["A", 2, "NAUSEA"],
+    ]
+    expected = legacy_top_symptom_brands(df, symptom_list=["VOMITING", "NAUSEA"], k=2)
+    assert_same_top_brands(got, expected, df, k=2)
+
+
+def test_top_symptom_brands_skips_missing_symptoms(reports):
+    symptoms = ["NAUSEA", "NOT A MEDDRA TERM", "VOMITING"]
+    # The legacy loop fails on a symptom without reports.
+    with pytest.raises(KeyError):
+        legacy_top_symptom_brands(reports, symptom_list=symptoms)
+    got = vis.top_symptom_brands(reports, symptom_list=symptoms)
+    expected = legacy_top_symptom_brands(reports, symptom_list=["NAUSEA", "VOMITING"])
+    assert_same_top_brands(got, expected, reports)
+
+
+def legacy_yearly_value_counts(df, year_col, column_name, d_threshold):
+    """Per-year value_counts loop of the original pie plot, with "Other" rows summed."""
+    parts = {}
+    for year, group in df.groupby(year_col):
+        counts = group[column_name].value_counts()
+        labels = counts.index.astype(object).where(counts >= counts.sum() * d_threshold, "Other")
+        parts[year] = counts.groupby(labels).sum().sort_values()
+    return parts
+
+
+def test_yearly_value_counts_merges_other_at_threshold():
+    df = pd.DataFrame(
+        {
+            "year": [2001] * 10 + [2004] * 2 + [2023] * 5,
+            "value": list("aaaaabbbcd") + ["z", "z"] + list("xxxxy"),
+        }
+    )
+    counts = vis.yearly_value_counts(df, "year", "value", d_threshold=0.2)
+    # c and d fall below a fifth of 2001; y is exactly a fifth of 2023 and is kept.
+    assert list(counts.items()) == [
+        ((2001, "Other"), 2),
+        ((2001, "b"), 3),
+        ((2001, "a"), 5),
+        ((2004, "z"), 2),
+        ((2023, "y"), 1),
+        ((2023, "x"), 4),
+    ]
+
+    fig = vis.plot_pie_subplots_yearly(
+        df.groupby("year"), "pies", "value", dropping=True, d_threshold=0.2, return_fig=True
+    )
+    assert [(t.title.text, list(t.labels), list(t.values)) for t in fig.data] == [
+        ("2001", ["Other", "b", "a"], [2, 3, 5]),
+        ("2004", ["z"], [2]),
+        ("2023", ["y", "x"], [1, 4]),
+    ]
+
+
+@pytest.mark.parametrize("d_threshold", [0.05, 0.3])
+def test_pie_subplots_yearly_matches_legacy_outside_2004_2020(exploded_reports, d_threshold):
+    rows = exploded_reports.assign(year=exploded_reports["caers_created_date"].dt.year)
+    # Move some reports before 2004 and after 2020, where the legacy grid stopped.
+    rows.loc[rows.index % 5 == 0, "year"] = 1999
+    rows.loc[rows.index % 5 == 1, "year"] = 2023
+    assert rows["year"].min() < 2004 and rows["year"].max() > 2020
+
+    fig = vis.plot_pie_subplots_yearly(
+        rows.groupby("year"),
+        "pies",
+        "outcomes",
+        dropping=True,
+        d_threshold=d_threshold,
+        return_fig=True,
+    )
+    expected = legacy_yearly_value_counts(rows, "year", "outcomes", d_threshold)
+    assert [t.title.text for t in fig.data] == [str(year) for year in sorted(expected)]
+    for trace in fig.data:
+        counts = expected[int(trace.title.text)]
+        assert sorted(trace.values) == counts.tolist()
+        assert dict(zip(trace.labels, trace.values)) == counts.to_dict()
+    # One pie per year on a grid of three columns.
+    assert len({(t.domain.x, t.domain.y) for t in fig.data}) == len(expected)